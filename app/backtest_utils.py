@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from metric_utils import grouped_metrics, hourly_median
+from model_utils import fit_model, predict_model
+from utils import partition_threads
+
+logger = logging.getLogger("solar_app")
+
+WINDOW_TYPES = ["expanding", "sliding"]
+
+# Estado de cada processo do pool: o DataFrame é enviado uma vez por worker (initializer),
+# e cada tarefa recebe apenas as posições do fold
+_WORKER_STATE = {}
+
+
+def make_folds(index, first_origin, horizon, step, n_folds=None, window="expanding", train_size=None, start=None):
+    # Folds por posição: treino [train_start, origin) e teste [origin, origin + horizon)
+    if window not in WINDOW_TYPES:
+        raise ValueError(f"Janela inválida: {window}. Use {WINDOW_TYPES}")
+    if window == "sliding" and not train_size:
+        raise ValueError("A janela deslizante requer train_size")
+
+    start_pos = 0 if start is None else int(index.searchsorted(pd.Timestamp(start)))
+    origin = int(index.searchsorted(pd.Timestamp(first_origin)))
+
+    folds = []
+    while origin + horizon <= len(index) and (n_folds is None or len(folds) < n_folds):
+        train_start = start_pos if window == "expanding" else max(start_pos, origin - train_size)
+        if origin > train_start:
+            folds.append(
+                {
+                    "fold": len(folds),
+                    "train_start": train_start,
+                    "origin": origin,
+                    "test_end": origin + horizon,
+                }
+            )
+        origin += step
+    return folds
+
+
+def run_backtest(df, target, model_type, folds, n_workers=None, progress=None):
+    n_workers = max(1, min(n_workers or os.cpu_count() or 1, len(folds) or 1))
+    n_jobs = partition_threads(n_workers)
+    logger.info(f"Backtest {model_type}: {len(folds)} folds, {n_workers} processos x {n_jobs} threads")
+
+    # Um fold inválido (ex.: modelo físico sem irradiação no recorte) não derruba o backtest inteiro
+    results, errors = [], []
+
+    def collect(fold, run):
+        try:
+            results.append(run())
+        except ValueError as e:
+            logger.warning(f"Backtest {model_type}: fold {fold['fold']} falhou: {e}")
+            errors.append({"fold": fold["fold"], "origin": df.index[fold["origin"]], "error": str(e)})
+        if progress is not None:
+            progress(len(results) + len(errors), len(folds))
+
+    if n_workers == 1:
+        _init_worker(df, target, model_type, n_jobs)
+        for fold in folds:
+            collect(fold, lambda fold=fold: _run_fold(fold))
+    else:
+        # spawn: não herda as threads do servidor do Streamlit
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(df, target, model_type, n_jobs),
+        ) as executor:
+            futures = {executor.submit(_run_fold, fold): fold for fold in folds}
+            for future in as_completed(futures):
+                collect(futures[future], future.result)
+
+    df_errors = pd.DataFrame(errors, columns=["fold", "origin", "error"]).set_index("fold").sort_index()
+    if not results:
+        reason = f": {df_errors['error'].iat[0]}" if len(df_errors) else ""
+        raise ValueError(f"Nenhum fold concluído no backtest{reason}")
+
+    df_pred = pd.concat(sorted(results, key=lambda df_fold: df_fold["fold"].iat[0]))
+    return df_pred, {**summarize_backtest(df_pred), "errors": df_errors}
+
+
+def summarize_backtest(df_pred):
+    # Métricas por fold e agregadas pela mesma redução agrupada de metric_utils
+    df_pred = df_pred.dropna(subset=["y_true", "y_pred"])
+    y_true = df_pred["y_true"].to_numpy(dtype=np.float64)
+    y_pred = df_pred["y_pred"].to_numpy(dtype=np.float64)
+    naive = df_pred["naive"].to_numpy(dtype=np.float64)
+    folds = df_pred["fold"].to_numpy()
+
+    df_folds = grouped_metrics(y_true, y_pred, naive, folds)
+    df_folds.index.name = "fold"
+    # Origem de cada fold: primeira linha do seu bloco
+    fold_ids, first = np.unique(folds, return_index=True)
+    origins = pd.Series(df_pred.index[first], index=fold_ids)
+    df_folds.insert(0, "origin", origins.reindex(df_folds.index))
+
+    df_total = grouped_metrics(y_true, y_pred, naive, np.zeros(len(folds), dtype=np.int64))
+    df_total.index = ["total"]
+    return {"folds": df_folds, "total": df_total}
+
+
+def _init_worker(df, target, model_type, n_jobs):
+    _WORKER_STATE.update(df=df, target=target, model_type=model_type, n_jobs=n_jobs)
+
+
+def _run_fold(fold):
+    df, target = _WORKER_STATE["df"], _WORKER_STATE["target"]
+    df_train = df.iloc[fold["train_start"]:fold["origin"]]
+    df_test = df.iloc[fold["origin"]:fold["test_end"]]
+
+    model = fit_model(_WORKER_STATE["model_type"], df_train, target, n_jobs=_WORKER_STATE["n_jobs"])
+    df_pred = predict_model(model, df_test, target)
+
+    # Referência ingênua do MASE calculada com o treino do próprio fold
+    df_pred["naive"] = hourly_median(df_train[target])[df_test.index.hour]
+    df_pred["fold"] = fold["fold"]
+    return df_pred
@@ -9,6 +9,9 @@ CUR_DATA_DIR = DATA_DIR / "current"
 CLEAN_DATA_DIR = DATA_DIR / "clean"
 RAW_DATA_DIR = DATA_DIR / "raw"
 FINAL_DATA_DIR = DATA_DIR / "final"
+STORE_DATA_DIR = DATA_DIR / "store"
+FEATURE_STORE_DIR = STORE_DATA_DIR / "features"
+MODEL_REGISTRY_DIR = ROOT_DIR / "models"
 LOG_DIR = ROOT_DIR / "logs"
 SRC_DIR = ROOT_DIR / "src"
 
@@ -29,6 +32,46 @@ TARGETS = [
     "uac_avg"
 ]
 
+METER_DTYPE = "float32"
+CALENDAR_DTYPES = {
+    "hour": "int8",
+    "day": "int8",
+    "weekday": "int8",
+    "month": "int8",
+    "weekend": "uint8",
+    "is_night": "uint8",
+}
+
+# Histogramas horários das métricas incrementais (MASE): centros de METRIC_HISTOGRAM_RANGE[0]
+# a METRIC_HISTOGRAM_RANGE[1] com METRIC_HISTOGRAM_BINS bins (kWh). A faixa padrão é genérica;
+# por alvo, histogram_range usa o máximo do histórico com folga de METRIC_HISTOGRAM_MARGIN
+METRIC_HISTOGRAM_RANGE = (0.0, 120.0)
+METRIC_HISTOGRAM_BINS = 481
+METRIC_HISTOGRAM_MARGIN = 0.25
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_MAX_RESAMPLES = 5000
+BOOTSTRAP_BLOCK_SIZE = 24
+# Células (linhas x reamostragens) da matriz de índices de cada lote do bootstrap
+BOOTSTRAP_CHUNK_CELLS = 2_000_000
+
+# Jobs de treino em segundo plano (threads por processo do Streamlit, intervalo de consulta em segundos)
+TRAINING_WORKERS = 2
+JOB_HISTORY_SIZE = 32
+JOB_POLL_INTERVAL = 1.0
+
+# Registro de modelos: entradas menos usadas são removidas acima deste tamanho total
+MODEL_REGISTRY_MAX_BYTES = 1024**3
+
+# Busca de hiperparâmetros (successive halving): fração final do treino usada como validação
+TUNING_BUDGET_SECONDS = 300
+TUNING_VALIDATION_FRACTION = 0.15
+
+# Previsão recursiva day-ahead: horizonte padrão e máximo (horas), uma origem por dia à meia-noite
+FORECAST_HORIZON = 24
+FORECAST_MAX_HORIZON = 48
+# Quantis da previsão probabilística (P10/P50/P90)
+FORECAST_QUANTILES = [0.1, 0.5, 0.9]
+
 START_DATE = "2023-06-01 00:00:00"
 SPLIT_TEST_DATE = "2024-03-19 23:59:59"
 SPLIT_DATE_EVAL = "2024-05-31 23:59:59"
@@ -36,6 +79,9 @@ END_DATE = "2024-06-15 23:59:59"
 
 LAGS = [1, 24, 48, 72, 96]
 WINDOWS = [3, 6, 12, 24]
+FEATURE_CACHE_SIZE = 16
+BINNED_REFERENCE_CACHE_SIZE = 4
+CYCLIC_PERIODS = {"hour": 24, "day": 31, "day_of_week": 7}
 
 IRRADIATION_FEATURES = [
     "air_temp",
@@ -124,14 +170,15 @@ WINDOWS_FEATURES = [
 
 IS_WEEKEND_MAP = {0: "Dia da Semana", 1: "Fim de Semana"}
 
+# Chaves de DatetimeIndex.weekday: 0 = segunda-feira
 DAY_MAPPING = {
-    0: "Domingo",
-    1: "Segunda-feira",
-    2: "Terça-feira",
-    3: "Quarta-feira",
-    4: "Quinta-feira",
-    5: "Sexta-feira",
-    6: "Sábado",
+    0: "Segunda-feira",
+    1: "Terça-feira",
+    2: "Quarta-feira",
+    3: "Quinta-feira",
+    4: "Sexta-feira",
+    5: "Sábado",
+    6: "Domingo",
 }
 
 MONTH_MAPPING = {
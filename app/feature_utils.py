@@ -1,22 +1,305 @@
+import json
+import logging
+import shutil
+import threading
+import warnings
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
 from config import settings
+from numpy.lib.stride_tricks import sliding_window_view
 from sklego.preprocessing import RepeatingBasisFunction
+from store_utils import PARTITION_FREQ, read_store, write_partitions
+from utils import LRUCache, dataset_fingerprint
+
+logger = logging.getLogger("solar_app")
+
+FEATURE_CACHE = LRUCache(maxsize=settings.FEATURE_CACHE_SIZE)
+_table_lock = threading.Lock()
+
+
+WINDOW_AGGREGATIONS = ["mean", "median", "std", "min", "max"]
+LAG_STATISTICS = ["lag_mean", "lag_median", "lag_std"]
+
+
+class FeatureGroup:
+    def __init__(self, name, columns, build, requires=None):
+        self.name = name
+        self.columns = list(columns)
+        self.build = build
+        self.requires = requires or (lambda columns: [])
+
+
+def get_feature_registry(target, lags=settings.LAGS, windows=settings.WINDOWS):
+    lag_columns = [f"lag{lag}" for lag in lags]
+
+    # A ordem da lista é topológica: cada grupo depende apenas de grupos anteriores
+    return [
+        FeatureGroup(
+            "time",
+            ["hour", "day", "day_of_week", "month", "is_weekend", "is_night"],
+            lambda df, columns: add_time_features(df),
+        ),
+        FeatureGroup(
+            "since",
+            ["time_since", "time_since_2"],
+            lambda df, columns: add_time_since(df),
+        ),
+        FeatureGroup(
+            "cyclic",
+            [f"{col}_{fn}" for col in ["hour", "day", "day_of_week"] for fn in ["sin", "cos"]],
+            lambda df, columns: add_cyclic_features(df, columns=_cyclic_base_columns(columns)),
+            requires=_cyclic_base_columns,
+        ),
+        FeatureGroup(
+            "rbf",
+            [f"rbf_{i}" for i in range(12)],
+            lambda df, columns: add_radial_basics_function(df),
+            requires=lambda columns: ["hour"],
+        ),
+        FeatureGroup(
+            "lags",
+            lag_columns,
+            lambda df, columns: add_lag_columns(df, target, [int(col[3:]) for col in columns]),
+        ),
+        FeatureGroup(
+            "lag_stats",
+            LAG_STATISTICS,
+            lambda df, columns: add_lag_statistics(df, lag_columns, columns),
+            requires=lambda columns: lag_columns,
+        ),
+        FeatureGroup(
+            "windows",
+            [f"window{window}_{agg}" for window in windows for agg in WINDOW_AGGREGATIONS],
+            lambda df, columns: _add_selected_window_features(df, target, columns),
+        ),
+    ]
+
+
+def resolve_feature_plan(features, registry):
+    column_group = {col: group for group in registry for col in group.columns}
+
+    needed = {}
+    pending = list(features)
+    while pending:
+        col = pending.pop()
+        if col not in column_group:
+            raise ValueError(f"Feature '{col}' não registrada.")
+
+        group = column_group[col]
+        selected = needed.setdefault(group.name, set())
+        if col not in selected:
+            selected.add(col)
+            pending.extend(group.requires([col]))
 
+    return [
+        (group, [col for col in group.columns if col in needed[group.name]])
+        for group in registry
+        if group.name in needed
+    ]
 
-def create_features(df, target, lags=settings.LAGS, windows=settings.WINDOWS):
+
+def create_features_cached(df, target, lags=settings.LAGS, windows=settings.WINDOWS, features=None):
+    # Cache compartilhado pelo processo: os reruns do Streamlit reutilizam as features já calculadas
+    key = (
+        target,
+        dataset_fingerprint(df),
+        tuple(lags),
+        tuple(windows),
+        None if features is None else tuple(features),
+    )
+
+    df_features = FEATURE_CACHE.get(key)
+    if df_features is None:
+        df_features = features_from_table(df, target, lags, windows, features)
+        FEATURE_CACHE.put(key, df_features)
+    return df_features
+
+
+def features_from_table(df, target, lags=settings.LAGS, windows=settings.WINDOWS, features=None):
+    # A série completa do alvo é servida pela tabela persistida, que só calcula os novos
+    # timestamps; outros recortes (ou falha de gravação) são calculados em memória
+    if list(df.columns) != [target]:
+        return create_features(df, target, lags, windows, features)
+
+    try:
+        with _table_lock:
+            table = update_feature_table(df, target, lags, windows)
+    except OSError as e:
+        logger.warning(f"Tabela de features de {target} indisponível: {e}")
+        return create_features(df, target, lags, windows, features)
+
+    table = table.loc[df.index.min():df.index.max()]
+    if features is None:
+        return table
+    return table[[target] + list(dict.fromkeys(features))]
+
+
+def create_features(df, target, lags=settings.LAGS, windows=settings.WINDOWS, features=None):
+    df = df.copy()
+
+    if features is None:
+        df = add_time_features(df)
+        df = add_time_since(df)
+        df = add_cyclic_features(df)
+        df = add_radial_basics_function(df)
+        df = add_lagged_features(df, target, lags)
+        df = add_window_features(df, target, windows)
+        return df
+
+    # Calcula apenas as features pedidas e suas dependências
+    features = list(dict.fromkeys(features))
+    for group, columns in resolve_feature_plan(features, get_feature_registry(target, lags, windows)):
+        df = group.build(df, columns)
+    return df[[target] + features]
+
+
+def create_multi_target_features(df, targets, lags=settings.LAGS, windows=settings.WINDOWS):
+    # Features de calendário, cíclicas, RBF e tempo desde dependem apenas do índice e são
+    # calculadas uma única vez; lags e janelas de todos os alvos saem de uma única passada
+    df_shared = pd.DataFrame(index=df.index)
+    df_shared = add_time_features(df_shared)
+    df_shared = add_time_since(df_shared)
+    df_shared = add_cyclic_features(df_shared)
+    df_shared = add_radial_basics_function(df_shared)
+
+    # Mesmo dtype de create_features (settings.METER_DTYPE para os medidores do store), para que
+    # cada alvo gere as mesmas chaves de experimento que o treino individual
+    dtype = np.result_type(*df[targets].dtypes, np.float32)
+    values = df[targets].to_numpy(dtype=np.float64)
+    lag_block = lag_matrix(values, lags)
+    lag_stats = lag_statistics(lag_block)
+    pairs = [(window, agg) for window in windows for agg in WINDOW_AGGREGATIONS]
+    window_block = rolling_window_stats(values, pairs)
+
+    columns = (
+        [f"lag{lag}" for lag in lags]
+        + LAG_STATISTICS
+        + [f"window{window}_{agg}" for window, agg in pairs]
+    )
+
+    # Layout (alvo, feature, linha): o bloco de cada alvo é contíguo em memória
+    block = np.empty((len(targets), len(columns), len(df)), dtype=dtype)
+    block[:, : len(lags)] = lag_block.transpose(1, 2, 0)
+    for idx, name in enumerate(LAG_STATISTICS, start=len(lags)):
+        block[:, idx] = lag_stats[name].T
+    block[:, len(lags) + len(LAG_STATISTICS):] = window_block.transpose(1, 2, 0)
+
+    return MultiTargetFeatures(df[targets], df_shared, block, columns)
+
+
+class MultiTargetFeatures:
+    def __init__(self, df_targets, df_shared, block, columns):
+        self.df_targets = df_targets
+        self.df_shared = df_shared
+        self.block = block
+        self.columns = columns
+        self.targets = list(df_targets.columns)
+
+    def target_block(self, target):
+        # View sem cópia sobre o bloco do alvo
+        block = self.block[self.targets.index(target)]
+        return pd.DataFrame(block.T, index=self.df_shared.index, columns=self.columns, copy=False)
+
+    def for_target(self, target, features=None):
+        # Mesmo layout de create_features: alvo, features compartilhadas e bloco do alvo
+        df = pd.concat([self.df_targets[[target]], self.df_shared, self.target_block(target)], axis="columns")
+        if features is None:
+            return df
+        return df[[target] + list(features)]
+
+    def to_frame(self):
+        n_targets, n_columns, n_rows = self.block.shape
+        columns = pd.MultiIndex.from_product([self.targets, self.columns], names=["target", "feature"])
+        return pd.DataFrame(
+            self.block.reshape(n_targets * n_columns, n_rows).T,
+            index=self.df_shared.index,
+            columns=columns,
+            copy=False,
+        )
+
+
+def update_feature_table(df, target, lags=settings.LAGS, windows=settings.WINDOWS):
+    # A produção só cresce no final da série: as linhas já gravadas não mudam e apenas
+    # os novos timestamps são calculados, usando como estado as últimas linhas da tabela
+    path = settings.FEATURE_STORE_DIR / target
+    meta = {"target": target, "lags": list(lags), "windows": list(windows), "dtype": str(df[target].dtype)}
+    freq = df.index.freq or settings.FREQUENCY
+
+    table, table_meta = read_feature_table(target)
+    if table is not None and (
+        {key: table_meta.get(key) for key in meta} != meta
+        or df.index.min() != pd.Timestamp(table_meta["origin"])
+        or _history_changed(table, df, target)
+    ):
+        logger.info(f"Tabela de features de {target} incompatível, recriando")
+        table = None
+
+    if table is None:
+        meta["origin"] = str(df.index.min())
+        table = _build_feature_rows(df[[target]], target, lags, windows, pd.Timestamp(meta["origin"]))
+
+        if path.exists():
+            shutil.rmtree(path)
+        write_partitions(table, path)
+        (path / "_meta.json").write_text(json.dumps(meta))
+        return table
+
+    df_new = df.loc[df.index > table.index.max(), [target]]
+    if df_new.empty:
+        return table
+
+    context = max(max(lags), max(windows))
+    df_state = table[[target]].iloc[-context:]
+    df_chunk = pd.concat([df_state, df_new]).asfreq(freq)
+
+    df_chunk = _build_feature_rows(df_chunk, target, lags, windows, pd.Timestamp(table_meta["origin"]))
+    df_chunk = df_chunk.loc[df_chunk.index > table.index.max()]
+    logger.info(f"Tabela de features de {target}: {len(df_chunk)} novas linhas")
+
+    table = pd.concat([table, df_chunk])
+    # Apenas os meses com linhas novas são regravados
+    first_period = df_chunk.index[0].to_period(PARTITION_FREQ)
+    write_partitions(table.loc[first_period.start_time:], path)
+    return table
+
+
+def _history_changed(table, df, target):
+    # Dados já gravados que foram corrigidos na origem invalidam a tabela
+    stored = table[target]
+    current = df[target].reindex(stored.index)
+    return not np.array_equal(stored.to_numpy(), current.to_numpy(dtype=stored.dtype), equal_nan=True)
+
+
+def read_feature_table(target):
+    path = settings.FEATURE_STORE_DIR / target
+    meta_path = path / "_meta.json"
+    if not meta_path.exists() or not any(path.glob("*.parquet")):
+        return None, None
+
+    meta = json.loads(meta_path.read_text())
+    return read_store(path, settings.FREQUENCY, schema=False), meta
+
+
+def _build_feature_rows(df, target, lags, windows, origin):
+    # Períodos cíclicos fixos e origem fixa para que blocos calculados separadamente
+    # tenham os mesmos valores da série completa
     df = df.copy()
     df = add_time_features(df)
-    df = add_time_since(df)
-    df = add_cyclic_features(df)
+    df = add_time_since(df, origin)
+    df = add_cyclic_features(df, periods=settings.CYCLIC_PERIODS)
     df = add_radial_basics_function(df)
     df = add_lagged_features(df, target, lags)
     df = add_window_features(df, target, windows)
     return df
 
 
-def add_time_since(df):
-    time_diff = df.index - df.index.min()
+def add_time_since(df, origin=None):
+    if origin is None:
+        origin = df.index.min()
+
+    time_diff = df.index - origin
     df["time_since"] = time_diff.total_seconds() / 3600
     df["time_since_2"] = df["time_since"] ** 2
     return df
@@ -32,14 +315,20 @@ def add_time_features(df):
     return df
 
 
-def add_cyclic_features(df, columns=None, drop_original=False):
+def add_cyclic_features(df, columns=None, drop_original=False, periods=None):
     if columns is None:
         columns = ["hour", "day", "day_of_week"]
 
     for col in columns:
-        freq = df[col].max() if df[col].min() != 0 else df[col].max() + 1
-        df[f"{col}_sin"] = np.sin(df[col] * (2.0 * np.pi / freq))
-        df[f"{col}_cos"] = np.cos(df[col] * (2.0 * np.pi / freq))
+        values = df[col].to_numpy()
+        if periods is not None:
+            freq = periods[col]
+        else:
+            freq = values.max() if values.min() != 0 else values.max() + 1
+
+        sin_table, cos_table = cyclic_table(int(freq))
+        df[f"{col}_sin"] = sin_table[values]
+        df[f"{col}_cos"] = cos_table[values]
 
     if drop_original:
         df.drop(columns, axis=1, inplace=True)
@@ -47,49 +336,196 @@ def add_cyclic_features(df, columns=None, drop_original=False):
     return df
 
 
+@lru_cache(maxsize=None)
+def cyclic_table(freq):
+    # Os campos de calendário assumem no máximo freq + 1 valores inteiros (0..freq),
+    # então seno e cosseno são calculados uma vez e lidos por índice
+    angles = np.arange(freq + 1) * (2.0 * np.pi / freq)
+    return np.sin(angles), np.cos(angles)
+
+
 def add_radial_basics_function(df):
+    table = rbf_table()
+    df_rbf = pd.DataFrame(
+        index=df.index,
+        data=table[df["hour"].to_numpy()],
+        columns=[f"rbf_{col}" for col in range(table.shape[1])],
+    )
+    return pd.concat([df, df_rbf], axis=1)
+
+
+@lru_cache(maxsize=None)
+def rbf_table(n_periods=12):
+    # O RepeatingBasisFunction depende apenas da hora (input_range fixo): é ajustado
+    # uma única vez sobre as 24 horas e aplicado como tabela de consulta
     rbf = RepeatingBasisFunction(
-        n_periods=12,
+        n_periods=n_periods,
         column="hour",
         input_range=(0, 23),
         remainder="drop",
     )
 
-    rbf.fit(df)
-    df_rbf = pd.DataFrame(
-        index=df.index,
-        data=rbf.transform(df)
-    )
-
-    df_rbf.columns = [f"rbf_{col}" for col in df_rbf.columns if str(col).isdigit()]
-    return pd.concat([df, df_rbf], axis=1)
+    hours = pd.DataFrame({"hour": np.arange(24)})
+    return rbf.fit(hours).transform(hours)
 
 
 def add_lagged_features(df, col, lags):
+    df = add_lag_columns(df, col, lags)
+    return add_lag_statistics(df, [f"lag{lag}" for lag in lags])
+
+
+def add_lag_columns(df, col, lags):
     if col not in df.columns:
         raise ValueError(f"Coluna '{col}' não encontrada no DataFrame.")
 
     if not all(isinstance(lag, int) and lag > 0 for lag in lags):
         raise ValueError("Lags devem ser inteiros positivos.")
 
-    col_lags = []
-    for lag in lags:
-        column_name = f"lag{lag}"
-        df[column_name] = df[col].shift(lag)
-        col_lags.append(column_name)
+    df[[f"lag{lag}" for lag in lags]] = lag_matrix(df[col].to_numpy(), lags)
+    return df
+
 
-    df["lag_mean"] = df[col_lags].mean(axis="columns")
-    df["lag_median"] = df[col_lags].median(axis="columns")
-    df["lag_std"] = df[col_lags].std(axis="columns")
+def add_lag_statistics(df, col_lags, statistics=None):
+    if statistics is None:
+        statistics = LAG_STATISTICS
+
+    block = df[col_lags].to_numpy()
+    stats = lag_statistics(block.astype(np.float64), statistics)
+    for name in statistics:
+        df[name] = stats[name].astype(block.dtype, copy=False)
     return df
 
 
+def lag_matrix(values, lags):
+    # Sobre a grade horária regular, o lag é um deslocamento posicional: uma única view
+    # deslizante de tamanho max(lags) + 1 contém todos os lags de cada linha.
+    # values pode ser (n,) ou (n, alvos); os lags ficam no último eixo
+    values = np.asarray(values)
+    values = values.astype(np.result_type(values.dtype, np.float32), copy=False)
+    max_lag = max(lags)
+
+    padding = np.full((max_lag,) + values.shape[1:], np.nan, dtype=values.dtype)
+    padded = np.concatenate([padding, values])
+    view = sliding_window_view(padded, max_lag + 1, axis=0)[: len(values)]
+    return view[..., [max_lag - lag for lag in lags]]
+
+
+def lag_statistics(block, statistics=None):
+    if statistics is None:
+        statistics = LAG_STATISTICS
+
+    reducers = {
+        "lag_mean": lambda: np.nanmean(block, axis=-1),
+        "lag_median": lambda: _lag_median(block),
+        "lag_std": lambda: np.nanstd(block, axis=-1, ddof=1),
+    }
+
+    # Linhas sem lags válidos (início da série) resultam em NaN, como no pandas
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return {name: reducers[name]() for name in statistics}
+
+
+def _lag_median(block):
+    # nanmedian é lento; apenas as linhas com lags ausentes (início da série) precisam dele
+    median = np.median(block, axis=-1)
+    has_nan = np.isnan(median)
+    if has_nan.any():
+        median[has_nan] = np.nanmedian(block[has_nan], axis=-1)
+    return median
+
+
 def add_window_features(df, col, windows, aggregations=None):
     if aggregations is None:
-        aggregations = ["mean", "median", "std", "min", "max"]
+        aggregations = WINDOW_AGGREGATIONS
 
-    for window in windows:
-        temp = df[col].rolling(window=window).agg(aggregations).shift(1)
-        temp.columns = [f"window{window}_{agg}" for agg in aggregations]
-        df = pd.concat([df, temp], axis="columns")
-    return df
+    pairs = [(window, agg) for window in windows for agg in aggregations]
+    return _concat_window_features(df, col, pairs)
+
+
+def rolling_window_stats(values, pairs):
+    # Equivalente a rolling(window).agg(agg).shift(1) para cada par (janela, agregação),
+    # calculado sobre views deslizantes (sem cópia) e gravado em um único array pré-alocado.
+    # values pode ser (n,) ou (n, alvos); os pares ficam no último eixo
+    values = np.asarray(values, dtype=np.float64)
+    n_rows = len(values)
+
+    # As janelas percorrem o eixo do tempo, mantido como último eixo contíguo em memória
+    series = np.ascontiguousarray(np.moveaxis(values, 0, -1))
+    out = np.full((len(pairs),) + series.shape, np.nan)
+
+    by_window = {}
+    for idx, (window, agg) in enumerate(pairs):
+        if agg not in WINDOW_AGGREGATIONS:
+            raise ValueError(f"Agregação '{agg}' não suportada.")
+        if not isinstance(window, int) or window <= 0:
+            raise ValueError("Janelas devem ser inteiros positivos.")
+        by_window.setdefault(window, []).append((idx, agg))
+
+    for window, aggs in by_window.items():
+        if window >= n_rows:
+            continue
+
+        # A linha t recebe a janela values[t - window:t], excluindo o valor corrente
+        view = sliding_window_view(series, window, axis=-1)[..., :-1, :]
+        stats = _window_statistics(view, {agg for _, agg in aggs})
+        for idx, agg in aggs:
+            out[idx, ..., window:] = stats[agg]
+
+    return np.moveaxis(out, (0, -1), (-1, 0))
+
+
+def _window_statistics(view, aggregations):
+    window = view.shape[-1]
+    stats = {}
+
+    # Uma única ordenação por janela fornece mínimo, mediana e máximo
+    if aggregations & {"min", "median", "max"}:
+        view = np.sort(view, axis=-1)
+        lowest, highest = view[..., 0], view[..., -1]
+        has_nan = np.isnan(highest)
+        mid = window // 2
+        median = view[..., mid] if window % 2 else (view[..., mid - 1] + view[..., mid]) / 2
+        stats["min"] = np.where(has_nan, np.nan, lowest)
+        stats["median"] = np.where(has_nan, np.nan, median)
+        stats["max"] = highest
+    elif "std" in aggregations:
+        lowest, highest = view.min(axis=-1), view.max(axis=-1)
+
+    mean = view.mean(axis=-1)
+    stats["mean"] = mean
+
+    if "std" in aggregations:
+        if window > 1:
+            deviation = view - mean[..., None]
+            std = np.sqrt(np.einsum("...j,...j->...", deviation, deviation) / (window - 1))
+            # Janelas constantes têm desvio exatamente zero, como no rolling do pandas
+            std[lowest == highest] = 0.0
+        else:
+            std = np.full(view.shape[:-1], np.nan)
+        stats["std"] = std
+
+    return stats
+
+
+def _concat_window_features(df, col, pairs):
+    values = df[col].to_numpy()
+    stats = rolling_window_stats(values, pairs)
+    df_windows = pd.DataFrame(
+        stats.astype(np.result_type(values.dtype, np.float32), copy=False),
+        index=df.index,
+        columns=[f"window{window}_{agg}" for window, agg in pairs],
+    )
+    return pd.concat([df, df_windows], axis="columns")
+
+
+def _add_selected_window_features(df, col, columns):
+    pairs = []
+    for column in columns:
+        window, agg = column.removeprefix("window").split("_", 1)
+        pairs.append((int(window), agg))
+    return _concat_window_features(df, col, pairs)
+
+
+def _cyclic_base_columns(columns):
+    return list(dict.fromkeys(col.rsplit("_", 1)[0] for col in columns))
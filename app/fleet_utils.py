@@ -0,0 +1,121 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+from config import settings
+from feature_utils import create_multi_target_features
+from metric_utils import error_breakdown
+from model_utils import MODEL_PARAMS, TrainingCancelled, is_cancelled
+from registry_utils import experiment_key, has_experiment, load_experiment, train_registered
+from utils import partition_threads
+
+logger = logging.getLogger("solar_app")
+
+
+def fleet_targets(df):
+    # Todos os inversores de INVERTER_MAPPING com dados carregados, seguidos dos agregados das plantas
+    inverters = [inverter["col"] for inverter in settings.INVERTER_MAPPING.values()]
+    targets = [col for col in inverters + settings.AGG_TARGETS if col in df.columns]
+    missing = [col for col in inverters + settings.AGG_TARGETS if col not in df.columns]
+    return targets, missing
+
+
+def run_fleet(
+    df,
+    targets,
+    model_type,
+    features,
+    split,
+    df_external=None,
+    n_workers=None,
+    progress=None,
+    cancel_event=None,
+):
+    # Um modelo por medidor: as features de todos os alvos saem de uma única passada
+    # (create_multi_target_features) e cada treino é agendado em um pool de threads
+    start = time.perf_counter()
+    multi_features = create_multi_target_features(df, targets)
+
+    n_workers = max(1, min(n_workers or os.cpu_count() or 1, len(targets)))
+    n_jobs = 1 if model_type == "Physical" else partition_threads(n_workers)
+    params = MODEL_PARAMS[model_type]
+    train_start, train_end, test_start, test_end = split
+
+    lock = threading.Lock()
+    done = []
+
+    def run(target):
+        if is_cancelled(cancel_event):
+            raise TrainingCancelled()
+
+        df_target = multi_features.for_target(target, features)
+        if df_external is not None:
+            df_target = pd.concat([df_target, df_external], axis="columns")
+        df_train = df_target.loc[train_start:train_end]
+        df_test = df_target.loc[test_start:test_end]
+
+        key = experiment_key(model_type, params, df_train, df_test, target)
+        result = load_experiment(key) if has_experiment(key) else None
+        cached = result is not None
+        if not cached:
+            result = train_registered(
+                key, model_type, df_train, df_test, target, params=params, n_jobs=n_jobs, cancel_event=cancel_event
+            )
+
+        with lock:
+            done.append(target)
+            if progress is not None:
+                progress(len(done) / len(targets))
+        return {"key": key, "cached": cached, "metrics": result["metrics"], "df_pred": result["df_pred"]}
+
+    logger.info(f"Frota {model_type}: {len(targets)} medidores, {n_workers} workers x {n_jobs} threads")
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="fleet") as executor:
+        futures = {executor.submit(run, target): target for target in targets}
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                results[target] = future.result()
+            except TrainingCancelled:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            except Exception as e:
+                logger.warning(f"Frota: {target} falhou: {e}")
+                errors[target] = str(e)
+
+    elapsed = time.perf_counter() - start
+    n_trained = sum(not result["cached"] for result in results.values())
+    return {
+        "metrics": fleet_metrics(results, targets),
+        "breakdown": inverter_breakdown(results, df.loc[train_start:train_end]),
+        "errors": errors,
+        "n_models": len(results),
+        "n_trained": n_trained,
+        "fleet_elapsed": elapsed,
+        "models_per_min": n_trained / elapsed * 60 if n_trained else 0.0,
+    }
+
+
+def fleet_metrics(results, targets):
+    rows = {
+        target: {**results[target]["metrics"], "cached": results[target]["cached"]}
+        for target in targets
+        if target in results
+    }
+    df_metrics = pd.DataFrame.from_dict(rows, orient="index")
+    df_metrics.index.name = "target"
+    return df_metrics
+
+
+def inverter_breakdown(results, df_train):
+    # Previsões dos inversores em formato longo (coluna "inverter") para a quebra de erros por inversor;
+    # os agregados das plantas ficam de fora
+    inverters = [inverter["col"] for inverter in settings.INVERTER_MAPPING.values() if inverter["col"] in results]
+    if not inverters:
+        return {}
+
+    df_pred = pd.concat([results[col]["df_pred"][["y_true", "y_pred"]].assign(inverter=col) for col in inverters])
+    return error_breakdown(df_pred, df_train[inverters])
@@ -0,0 +1,199 @@
+import re
+
+import numpy as np
+import pandas as pd
+from config import settings
+from feature_utils import LAG_STATISTICS, lag_statistics
+from metric_utils import grouped_metrics, hourly_median
+from model_utils import TrainingCancelled, is_cancelled, predict_features
+from numpy.lib.stride_tricks import sliding_window_view
+
+LAG_PATTERN = re.compile(r"lag(\d+)$")
+WINDOW_PATTERN = re.compile(r"window(\d+)_(\w+)$")
+
+
+class RecursiveState:
+    # Estado de lags e janelas de várias origens avançando juntas: buffer circular
+    # (origens x histórico) e, por janela, soma, soma dos quadrados, contagem de NaN e
+    # comprimento da sequência de valores iguais mais recente, todos atualizados em O(1) por passo
+    def __init__(self, history, windows):
+        # history: (origens, tamanho) com os valores anteriores a cada origem, do mais antigo ao mais recente
+        self.buffer = np.array(history, dtype=np.float64)
+        self.size = self.buffer.shape[1]
+        self.head = 0
+        self.windows = sorted(set(windows))
+        if self.windows and max(self.windows) > self.size:
+            raise ValueError("O histórico deve cobrir a maior janela.")
+
+        self.sums, self.squares, self.nans = {}, {}, {}
+        for window in self.windows:
+            block = self.window(window)
+            self.sums[window] = np.nansum(block, axis=-1)
+            self.squares[window] = np.nansum(block**2, axis=-1)
+            self.nans[window] = np.isnan(block).sum(axis=-1)
+
+        # Janelas constantes têm desvio exatamente zero, como no rolling do pandas
+        equal = self.buffer == self.buffer[:, -1:]
+        self.run = np.where(equal.all(axis=-1), self.size, np.argmin(equal[:, ::-1], axis=-1))
+
+    def lag(self, lag):
+        return self.buffer[:, (self.head - lag) % self.size]
+
+    def window(self, window):
+        return self.buffer[:, (self.head - np.arange(window, 0, -1)) % self.size]
+
+    def push(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        new_nan = np.isnan(values)
+        for window in self.windows:
+            leaving = self.buffer[:, (self.head - window) % self.size]
+            old_nan = np.isnan(leaving)
+            self.sums[window] += np.where(new_nan, 0.0, values) - np.where(old_nan, 0.0, leaving)
+            self.squares[window] += np.where(new_nan, 0.0, values**2) - np.where(old_nan, 0.0, leaving**2)
+            self.nans[window] += new_nan.astype(np.int64) - old_nan
+
+        self.run = np.where(new_nan, 0, np.where(values == self.lag(1), self.run + 1, 1))
+        self.buffer[:, self.head] = values
+        self.head = (self.head + 1) % self.size
+
+        # Somas correntes acumulam erro de arredondamento; janelas constantes são recalculadas exatamente
+        for window in self.windows:
+            constant = self.run >= window
+            self.sums[window] = np.where(constant, window * values, self.sums[window])
+            self.squares[window] = np.where(constant, window * values**2, self.squares[window])
+
+    def window_features(self, window, aggregations):
+        stats = {}
+        valid = self.nans[window] == 0
+        mean = np.where(valid, self.sums[window] / window, np.nan)
+        stats["mean"] = mean
+
+        if "std" in aggregations:
+            if window > 1:
+                variance = (self.squares[window] - window * mean**2) / (window - 1)
+                std = np.sqrt(np.maximum(variance, 0.0))
+                std[self.run >= window] = 0.0
+            else:
+                std = np.full(len(mean), np.nan)
+            stats["std"] = std
+
+        # Mínimo, mediana e máximo não têm atualização O(1): ordenam a janela (até max(WINDOWS) valores)
+        if aggregations & {"min", "median", "max"}:
+            block = np.sort(self.window(window), axis=-1)
+            mid = window // 2
+            median = block[:, mid] if window % 2 else (block[:, mid - 1] + block[:, mid]) / 2
+            stats["min"] = np.where(valid, block[:, 0], np.nan)
+            stats["median"] = np.where(valid, median, np.nan)
+            stats["max"] = np.where(valid, block[:, -1], np.nan)
+
+        return stats
+
+
+def state_columns(columns):
+    # Colunas que dependem do alvo e são recalculadas a cada passo a partir das próprias previsões
+    lags = {}
+    windows = {}
+    for col in columns:
+        if match := LAG_PATTERN.fullmatch(col):
+            lags[col] = int(match.group(1))
+        elif match := WINDOW_PATTERN.fullmatch(col):
+            windows.setdefault(int(match.group(1)), {})[match.group(2)] = col
+    statistics = [col for col in columns if col in LAG_STATISTICS]
+    return lags, statistics, windows
+
+
+def forecast_origins(index, start, end, horizon, step=24):
+    # Origens diárias (meia-noite) cujo horizonte completo cabe entre start e end
+    index = pd.DatetimeIndex(index)
+    period = index[(index >= start) & (index <= end)]
+    if len(period) == 0:
+        return period
+
+    first = period[0].ceil("D")
+    origins = pd.date_range(first, period[-1], freq=f"{step}h")
+    origins = origins[origins.isin(index)]
+    positions = index.get_indexer(origins)
+    last = index.get_indexer([period[-1]])[0]
+    return origins[positions + horizon - 1 <= last]
+
+
+def recursive_forecast(
+    model, df_features, target, origins, horizon, lags=settings.LAGS, progress=None, cancel_event=None
+):
+    # Previsão recursiva de várias origens em lote: a cada passo uma única chamada de predição
+    # para todas as origens, e a previsão realimenta os lags e as janelas do passo seguinte.
+    # Calendário e recursos externos vêm das próprias linhas de df_features. As estatísticas
+    # de lag usam todos os lags de create_features, mesmo os que não são colunas do modelo
+    columns = [col for col in df_features.columns if col != target]
+    lag_columns, statistics, windows = state_columns(columns)
+    stat_lags = list(lags) if statistics else []
+    size = max(list(lag_columns.values()) + stat_lags + list(windows) + [1])
+
+    values = df_features[target].to_numpy(dtype=np.float64)
+    positions = df_features.index.get_indexer(origins)
+    if (positions < 0).any() or (positions + horizon > len(values)).any():
+        raise ValueError("Origens fora do intervalo de df_features.")
+
+    # A linha t usa apenas valores anteriores a t, como em create_features
+    padded = np.concatenate([np.full(size, np.nan), values])
+    state = RecursiveState(sliding_window_view(padded, size)[positions], windows)
+
+    x_all = df_features[columns].to_numpy(dtype=np.float64)
+    col_index = {col: idx for idx, col in enumerate(columns)}
+    lag_cols = [col_index[col] for col in lag_columns]
+    stat_cols = [col_index[col] for col in statistics]
+
+    y_pred = np.empty((len(positions), horizon))
+    for step in range(horizon):
+        if is_cancelled(cancel_event):
+            raise TrainingCancelled()
+
+        x = x_all[positions + step]
+        if lag_columns:
+            x[:, lag_cols] = np.column_stack([state.lag(lag) for lag in lag_columns.values()])
+        if statistics:
+            stats = lag_statistics(np.column_stack([state.lag(lag) for lag in stat_lags]), statistics)
+            x[:, stat_cols] = np.column_stack([stats[name] for name in statistics])
+        for window, aggregations in windows.items():
+            stats = state.window_features(window, set(aggregations))
+            for agg, col in aggregations.items():
+                x[:, col_index[col]] = stats[agg]
+
+        y_step = predict_features(model, pd.DataFrame(x, columns=columns))
+        if y_step.ndim > 1:
+            # Modelos de quantis realimentam o quantil central (P50)
+            y_step = y_step[:, y_step.shape[1] // 2]
+        y_pred[:, step] = y_step
+        state.push(y_step)
+        if progress is not None:
+            progress((step + 1) / horizon)
+
+    rows = (positions[:, None] + np.arange(horizon)).ravel()
+    df_forecast = pd.DataFrame(
+        {
+            "origin": np.repeat(origins, horizon),
+            "horizon": np.tile(np.arange(1, horizon + 1), len(positions)),
+            "y_pred": y_pred.ravel(),
+            "y_true": values[rows],
+        },
+        index=df_features.index[rows],
+    )
+    return df_forecast
+
+
+def horizon_metrics(df_forecast, y_train, oracle=None):
+    # Métricas por horizonte; oracle (previsão um passo à frente com lags verdadeiros) é avaliada
+    # nas mesmas linhas para comparação
+    df_forecast = df_forecast.dropna(subset=["y_true", "y_pred"])
+    y_true = df_forecast["y_true"].to_numpy(dtype=np.float64)
+    naive = hourly_median(y_train)[np.asarray(df_forecast.index.hour)]
+    codes = df_forecast["horizon"].to_numpy()
+
+    df_metrics = grouped_metrics(y_true, df_forecast["y_pred"].to_numpy(dtype=np.float64), naive, codes)
+    df_metrics.index.name = "horizon"
+    if oracle is not None:
+        y_oracle = oracle.reindex(df_forecast.index).to_numpy(dtype=np.float64)
+        df_oracle = grouped_metrics(y_true, y_oracle, naive, codes)
+        df_metrics["mae_oracle"] = df_oracle["mae"]
+        df_metrics["rmse_oracle"] = df_oracle["rmse"]
+    return df_metrics
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from model_utils import TrainingCancelled
+
+logger = logging.getLogger("solar_app")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    def __init__(self, name, meta=None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.meta = meta or {}
+        self.status = PENDING
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.submitted_at
+
+    def set_progress(self, value):
+        self.progress = min(1.0, max(self.progress, float(value)))
+
+
+class JobManager:
+    # Executa funções de treino em threads (XGBoost/LightGBM liberam o GIL) e guarda o estado
+    # de cada job para a página consultar a cada rerun
+    def __init__(self, max_workers=2, history_size=32):
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="train-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, meta=None, **kwargs):
+        # fn recebe progress e cancel_event como argumentos nomeados
+        job = Job(name, meta)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        logger.info(f"Job {job.id[:8]} enviado: {name}")
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def collect(self, job_id):
+        # Entrega o resultado de um job finalizado uma única vez e o descarta: o histórico
+        # guarda apenas estado e metadados, não modelos e previsões de cada sessão
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return None
+            result, job.result = job.result, None
+            return result
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED)
+        return True
+
+    def shutdown(self):
+        for job in self.jobs():
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+
+        job.status = RUNNING
+        try:
+            job.result = fn(*args, progress=job.set_progress, cancel_event=job.cancel_event, **kwargs)
+        except TrainingCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            logger.exception(f"Job {job.id[:8]} falhou: {job.name}")
+            job.error = str(e)
+            self._finish(job, FAILED)
+        else:
+            self._finish(job, DONE)
+
+    def _finish(self, job, status):
+        job.finished_at = time.time()
+        job.status = status
+        logger.info(f"Job {job.id[:8]} {status} em {job.elapsed:.1f}s: {job.name}")
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.finished]
+        excess = len(self._jobs) - self.history_size
+        for job in sorted(finished, key=lambda job: job.finished_at)[:max(0, excess)]:
+            del self._jobs[job.id]
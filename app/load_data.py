@@ -1,74 +1,99 @@
 import logging
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import streamlit as st
 from config import settings
-from feature_utils import create_features
+from store_utils import load_store, store_exists
 
 logger = logging.getLogger("solar_app")
 
-
-@st.cache_data
-def load_dataset(filepath, freq):
-    logger.info(f"Carregando dados: {filepath}")
-
-    df = pd.read_csv(filepath, parse_dates=["date_time"])
-    df.set_index("date_time", inplace=True)
-    df.index = df.index.tz_localize(None)
-    df = df.sort_index()
-    return df.asfreq(freq)
+DATASETS = {
+    # "df_prod": "1.1_energy_prod_ldtea.csv",
+    "df_prod": "1.0_energy_prod_all.csv",
+    "df_rad_tempook": "0.1_radiation_tempook_p60m.csv",
+    "df_rad_solcast": "0.2_radiation_solcast_p60m.csv",
+}
 
 
 def load_process_data(file_name, freq, df_name):
-    file_path = Path(settings.FINAL_DATA_DIR / file_name)
-
-    if not file_path.exists():
-        logger.error(f"Arquivo {file_path} não encontrado")
-        st.error(f"Arquivo {file_path} não encontrado")
-        st.stop()
-
-    df = load_dataset(file_path, freq)
+    df = load_store(file_name, freq)
     df.columns = df.columns.str.replace(" ", "_").str.lower()
 
     if df_name == "df_prod":
         df = add_time_features(df)
 
-    return df.sort_index()
+    return read_only_frame(df)
+
+
+def read_only_frame(df):
+    # Os DataFrames carregados são compartilhados por todas as sessões (st.cache_resource):
+    # com arrays somente leitura, uma escrita in-place acidental levanta erro em vez de
+    # alterar os dados de todos os usuários
+    columns = {}
+    for col in df.columns:
+        values = df[col].array
+        if isinstance(values, pd.arrays.NumpyExtensionArray):
+            values = values.to_numpy().copy()
+            values.flags.writeable = False
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+@st.cache_resource(show_spinner=False)
+def load_datasets(freq):
+    # A leitura do parquet (pyarrow) libera o GIL, então threads bastam para
+    # carregar os conjuntos de dados em paralelo sem copiar os DataFrames entre processos
+    with ThreadPoolExecutor(max_workers=len(DATASETS)) as executor:
+        futures = {
+            df_name: executor.submit(load_process_data, file_name, freq, df_name)
+            for df_name, file_name in DATASETS.items()
+        }
+        return {df_name: future.result() for df_name, future in futures.items()}
+
+
+def check_data_files():
+    for file_name in DATASETS.values():
+        file_path = settings.FINAL_DATA_DIR / file_name
+
+        if not file_path.exists() and not store_exists(file_name):
+            logger.error(f"Arquivo {file_path} não encontrado")
+            st.error(f"Arquivo {file_path} não encontrado")
+            st.stop()
 
 
 def add_time_features(df):
     logger.info("Adicionando recursos temporais - Time Features")
 
-    df = df.copy()
-    df["hour"] = df.index.hour
-    df["day"] = df.index.day
-    df["weekday"] = df.index.weekday
-    df["month"] = df.index.month
-    df["weekend"] = df.weekday.isin([5, 6]).astype(int)
-    df["is_night"] = ((df["hour"] >= 18) | (df["hour"] <= 6)).astype(int)
-    df["month_name"] = df["month"].map(settings.MONTH_MAPPING)
-    df["day_name"] = df["weekday"].map(settings.DAY_MAPPING)
+    df = df.copy(deep=False)
+    index = df.index
+    df["hour"] = index.hour
+    df["day"] = index.day
+    df["weekday"] = index.weekday
+    df["month"] = index.month
+    df["weekend"] = index.weekday >= 5
+    df["is_night"] = (index.hour >= 18) | (index.hour <= 6)
+    df = df.astype(settings.CALENDAR_DTYPES)
+
+    df["month_name"] = pd.Categorical.from_codes(
+        df["month"].to_numpy() - 1, categories=list(settings.MONTH_MAPPING.values()), ordered=True
+    )
+    df["day_name"] = pd.Categorical.from_codes(
+        df["weekday"].to_numpy(), categories=list(settings.DAY_MAPPING.values()), ordered=True
+    )
     return df
 
 
 def load_data():
     logger.info("Iniciando load_data")
 
-    freq = settings.FREQUENCY
-    if "df_prod" not in st.session_state:
-        # file_name = "1.1_energy_prod_ldtea.csv"
-        file_name = "1.0_energy_prod_all.csv"
-        df_prod = load_process_data(file_name, freq, "df_prod")
-        st.session_state.df_prod = df_prod
-
-    if "df_rad_tempook" not in st.session_state:
-        file_name = "0.1_radiation_tempook_p60m.csv"
-        st.session_state.df_rad_tempook = load_process_data(file_name, freq, "df_rad_tempook")
-
-    if "df_rad_solcast" not in st.session_state:
-        file_name = "0.2_radiation_solcast_p60m.csv"
-        st.session_state.df_rad_solcast = load_process_data(file_name, freq, "df_rad_solcast")
+    missing = [df_name for df_name in DATASETS if df_name not in st.session_state]
+    if missing:
+        check_data_files()
+        datasets = load_datasets(settings.FREQUENCY)
+        # Cópia rasa por sessão: colunas novas ficam na sessão e os arrays continuam compartilhados
+        for df_name in missing:
+            st.session_state[df_name] = datasets[df_name].copy(deep=False)
 
     # if "df_wth" not in st.session_state:
     #     file_name = "data_weather_p60m.csv"
@@ -1,5 +1,19 @@
+import logging
+import warnings
+
 import numpy as np
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+import pandas as pd
+from config import settings
+from sklearn.metrics import mean_absolute_error
+
+logger = logging.getLogger("solar_app")
+
+DAYTIME_START = 6 * 3600
+DAYTIME_END = 18 * 3600
+
+METRICS = ["mae", "rmse", "mse", "r2", "mape", "mase"]
+
+BREAKDOWN_KEYS = ["hour", "month", "weekday", "inverter"]
 
 
 # MAPE
@@ -34,23 +48,453 @@ def mean_absolute_scaled_error(y_true, y_pred, y_train):
         return None
 
 
-def calculate_forecast_accuracy(y_true, y_pred, y_train):
-    y_true_day = y_true.between_time('06:00:00', '18:00:00')
-    y_pred_day = y_pred.between_time('06:00:00', '18:00:00')
-    y_train_day = y_train.between_time('06:00:00', '18:00:00')
+# Pinball (quantile loss)
+def pinball_loss(y_true, y_quantile, quantile):
+    residual = np.asarray(y_true, dtype=np.float64) - np.asarray(y_quantile, dtype=np.float64)
+    return np.mean(np.maximum(quantile * residual, (quantile - 1) * residual))
+
+
+def quantile_column(quantile):
+    return f"y_p{round(quantile * 100)}"
+
+
+def quantile_metrics(df_pred, quantiles):
+    # Perda pinball de cada quantil e cobertura empírica do intervalo entre o menor e o maior
+    # quantil (P10-P90: nominal 80%)
+    df_pred = df_pred.dropna(subset=["y_true"])
+    y_true = df_pred["y_true"].to_numpy(dtype=np.float64)
+    quantiles = sorted(quantiles)
+
+    metrics = {
+        f"pinball_p{round(quantile * 100)}": float(pinball_loss(y_true, df_pred[quantile_column(quantile)], quantile))
+        for quantile in quantiles
+    }
+    if len(quantiles) > 1:
+        lower = df_pred[quantile_column(quantiles[0])].to_numpy()
+        upper = df_pred[quantile_column(quantiles[-1])].to_numpy()
+        nominal = round((quantiles[-1] - quantiles[0]) * 100)
+        # Tolerância do arredondamento float32 dos boosters: nas horas de produção zero a faixa
+        # degenera em ~0 e o valor observado deve contar como coberto
+        tolerance = np.finfo(np.float32).eps * max(1.0, np.max(np.abs(y_true), initial=0.0))
+        covered = (y_true >= lower - tolerance) & (y_true <= upper + tolerance)
+        metrics[f"coverage_{nominal}"] = float(np.mean(covered))
+    return metrics
+
+
+def daytime_mask(index):
+    # Mesmo intervalo de between_time('06:00:00', '18:00:00'), com os extremos incluídos
+    seconds = index.hour * 3600 + index.minute * 60 + index.second
+    return np.asarray((seconds >= DAYTIME_START) & (seconds <= DAYTIME_END))
+
+
+def hourly_median(y_train, mask=None):
+    values = np.asarray(y_train, dtype=np.float64)
+    hours = np.asarray(y_train.index.hour)
+    if mask is not None:
+        values, hours = values[mask], hours[mask]
+
+    medians = pd.Series(values).groupby(hours).median()
+    return medians.reindex(range(24)).to_numpy()
+
+
+def forecast_metrics(y_true, y_pred, naive, weights):
+    # Métricas ponderadas por uma máscara 0/1 (escopo) ao longo do eixo 0. Os arrays podem ser
+    # (n,) ou (n, m): cada coluna é uma previsão (modelo, fold ou reamostragem) avaliada de uma vez
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    def scope_sum(values, scope=weights):
+        # Valores fora do escopo (ex.: mediana ingênua noturna NaN) não entram na soma
+        return np.sum(np.where(scope > 0, scope * values, 0.0), axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        residual = y_true - y_pred
+        n_obs = scope_sum(np.ones_like(residual))
+
+        mae = scope_sum(np.abs(residual)) / n_obs
+        ss_res = scope_sum(residual**2)
+        mse = ss_res / n_obs
+
+        y_mean = scope_sum(y_true) / n_obs
+        ss_tot = scope_sum((y_true - y_mean) ** 2)
+        # Mesmo tratamento do sklearn (force_finite) quando o alvo é constante
+        r2 = np.where(ss_tot == 0, np.where(ss_res == 0, 1.0, 0.0), 1 - ss_res / ss_tot)
+
+        mape_weights = weights * (y_true != 0)
+        ape = np.abs(np.divide(residual, y_true, out=np.zeros_like(residual), where=y_true != 0))
+        mape = scope_sum(ape, mape_weights) / scope_sum(1.0, mape_weights)
+
+        mae_naive = scope_sum(np.abs(y_true - naive)) / n_obs
+        mase = np.where(mae_naive == 0, 0.0, mae / mae_naive)
 
     return {
-        "mae": mean_absolute_error(y_true, y_pred),
-        "rmse": mean_squared_error(y_true, y_pred, squared=False),
-        "mse": mean_squared_error(y_true, y_pred),
-        "r2": r2_score(y_true, y_pred),
-        "mape": mean_absolute_percentage_error(y_true, y_pred),
-        "mase": mean_absolute_scaled_error(y_true, y_pred, y_train),
-
-        "mae_day": mean_absolute_error(y_true_day, y_pred_day),
-        "rmse_day": mean_squared_error(y_true_day, y_pred_day, squared=False),
-        "mse_day": mean_squared_error(y_true_day, y_pred_day),
-        "r2_day": r2_score(y_true_day, y_pred_day),
-        "mape_day": mean_absolute_percentage_error(y_true_day, y_pred_day),
-        "mase_day": mean_absolute_scaled_error(y_true_day, y_pred_day, y_train_day),
+        "mae": mae,
+        "rmse": np.sqrt(mse),
+        "mse": mse,
+        "r2": r2,
+        "mape": mape,
+        "mase": mase,
     }
+
+
+def score_forecasts(y_true, y_pred, y_train):
+    # Resíduos calculados uma única vez; o escopo diurno é uma máscara pré-calculada
+    day, naive, naive_day = _scope_arrays(y_true, y_train)
+
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    y_true = np.asarray(y_true, dtype=np.float64)
+    if y_pred.ndim == 2:
+        y_true, day = y_true[:, None], day[:, None]
+        naive, naive_day = naive[:, None], naive_day[:, None]
+
+    return _score_scopes(y_true, y_pred, naive, naive_day, day)
+
+
+def bootstrap_metrics(
+    y_true,
+    y_pred,
+    y_train,
+    n_resamples=settings.BOOTSTRAP_RESAMPLES,
+    block_size=settings.BOOTSTRAP_BLOCK_SIZE,
+    confidence=0.95,
+    seed=None,
+):
+    # Bootstrap em blocos móveis: as reamostragens são processadas em lotes cuja matriz de índices
+    # (n, lote) cabe em BOOTSTRAP_CHUNK_CELLS; cada lote é reduzido às métricas por reamostragem
+    day, naive, naive_day = _scope_arrays(y_true, y_train)
+    values = np.asarray(y_true, dtype=np.float64)
+    predictions = np.asarray(y_pred, dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    chunk_size = max(1, settings.BOOTSTRAP_CHUNK_CELLS // max(1, len(values)))
+    chunks = []
+    for start in range(0, n_resamples, chunk_size):
+        idx = block_bootstrap_indices(len(values), min(chunk_size, n_resamples - start), block_size, rng)
+        chunks.append(_score_scopes(values[idx], predictions[idx], naive[idx], naive_day[idx], day[idx]))
+    samples = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+    alpha = (1 - confidence) / 2
+    point = score_forecasts(y_true, y_pred, y_train)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return pd.DataFrame(
+            {
+                "value": [float(point[key]) for key in samples],
+                "lower": [np.nanquantile(samples[key], alpha) for key in samples],
+                "upper": [np.nanquantile(samples[key], 1 - alpha) for key in samples],
+            },
+            index=list(samples),
+        )
+
+
+def block_bootstrap_indices(n_obs, n_resamples, block_size, rng):
+    block_size = max(1, min(block_size, n_obs))
+    n_blocks = -(-n_obs // block_size)
+
+    starts = rng.integers(0, n_obs - block_size + 1, size=(n_resamples, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block_size)).reshape(n_resamples, -1)[:, :n_obs]
+    return idx.T
+
+
+def _scope_arrays(y_true, y_train):
+    hours = np.asarray(y_true.index.hour)
+    day = daytime_mask(y_true.index)
+    naive = hourly_median(y_train)[hours]
+    naive_day = hourly_median(y_train, daytime_mask(y_train.index))[hours]
+    return day, naive, naive_day
+
+
+def _score_scopes(y_true, y_pred, naive, naive_day, day):
+    metrics = forecast_metrics(y_true, y_pred, naive, np.ones_like(day, dtype=np.float64))
+    metrics_day = forecast_metrics(y_true, y_pred, naive_day, day)
+
+    results = dict(metrics)
+    results.update({f"{key}_day": value for key, value in metrics_day.items()})
+    return results
+
+
+def score_predictions(y_true, df_preds, y_train):
+    # Avalia várias previsões (colunas de df_preds: modelos, folds...) numa única chamada
+    metrics = score_forecasts(y_true, df_preds.to_numpy(), y_train)
+    return pd.DataFrame(metrics, index=df_preds.columns)
+
+
+def calculate_forecast_accuracy(y_true, y_pred, y_train):
+    metrics = score_forecasts(y_true, y_pred, y_train)
+    return {key: float(value) for key, value in metrics.items()}
+
+
+def error_breakdown(df_pred, y_train, keys=BREAKDOWN_KEYS):
+    # Métricas por grupo (hora, mês, dia da semana, inversor). df_pred pode trazer uma coluna
+    # "inverter" (formato longo); nesse caso y_train deve ter uma coluna por inversor
+    df_pred = df_pred.dropna(subset=["y_true", "y_pred"])
+    index = df_pred.index
+    hours = np.asarray(index.hour)
+
+    inverter = df_pred["inverter"] if "inverter" in df_pred else None
+    if inverter is None:
+        naive = hourly_median(y_train)[hours]
+    else:
+        inverter = pd.Categorical(inverter)
+        medians = y_train.groupby(y_train.index.hour).median().reindex(range(24))
+        medians = medians.reindex(columns=inverter.categories).to_numpy(dtype=np.float64)
+        naive = medians[hours, inverter.codes]
+
+    group_keys = {
+        "hour": (hours, None),
+        "month": (np.asarray(index.month), settings.MONTH_MAPPING),
+        "weekday": (np.asarray(index.weekday), settings.DAY_MAPPING),
+    }
+    if inverter is not None:
+        group_keys["inverter"] = (inverter.codes, dict(enumerate(inverter.categories)))
+
+    y_true = df_pred["y_true"].to_numpy(dtype=np.float64)
+    y_pred = df_pred["y_pred"].to_numpy(dtype=np.float64)
+
+    results = {}
+    for key in keys:
+        if key not in group_keys:
+            continue
+        codes, labels = group_keys[key]
+        df_group = grouped_metrics(y_true, y_pred, naive, codes)
+        if labels is not None:
+            df_group.index = df_group.index.map(labels)
+        df_group.index.name = key
+        results[key] = df_group
+    return results
+
+
+def grouped_metrics(y_true, y_pred, naive, codes):
+    # Uma única ordenação pelos códigos; cada soma por grupo é um np.add.reduceat sobre os
+    # segmentos contíguos, sem groupby().apply
+    order = np.argsort(codes, kind="stable")
+    codes = np.asarray(codes)[order]
+    y_true, y_pred, naive = y_true[order], y_pred[order], naive[order]
+
+    if codes.size == 0:
+        return pd.DataFrame(columns=METRICS + ["n_obs"], dtype=np.float64)
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+    def group_sum(values):
+        return np.add.reduceat(values, starts)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        residual = y_true - y_pred
+        n_obs = np.diff(np.r_[starts, codes.size]).astype(np.float64)
+
+        mae = group_sum(np.abs(residual)) / n_obs
+        ss_res = group_sum(residual**2)
+        mse = ss_res / n_obs
+
+        # R² em duas passagens: média do grupo e depois a soma dos desvios quadráticos
+        y_mean = group_sum(y_true) / n_obs
+        ss_tot = group_sum((y_true - np.repeat(y_mean, n_obs.astype(np.int64))) ** 2)
+        r2 = np.where(ss_tot == 0, np.where(ss_res == 0, 1.0, 0.0), 1 - ss_res / ss_tot)
+
+        nonzero = y_true != 0
+        ape = np.abs(np.divide(residual, y_true, out=np.zeros_like(residual), where=nonzero))
+        mape = group_sum(ape) / group_sum(nonzero.astype(np.float64))
+
+        naive_error = np.abs(y_true - naive)
+        mae_naive = group_sum(np.where(np.isnan(naive_error), 0.0, naive_error)) / n_obs
+        mase = np.where(mae_naive == 0, 0.0, mae / mae_naive)
+
+    return pd.DataFrame(
+        {
+            "mae": mae,
+            "rmse": np.sqrt(mse),
+            "mse": mse,
+            "r2": r2,
+            "mape": mape,
+            "mase": mase,
+            "n_obs": n_obs.astype(np.int64),
+        },
+        index=codes[starts],
+    )
+
+
+def histogram_range(values, margin=settings.METRIC_HISTOGRAM_MARGIN):
+    # Faixa do histograma derivada do alvo (ex.: histórico de treino), com folga acima do máximo
+    values = np.asarray(values, dtype=np.float64)
+    low = min(0.0, float(np.nanmin(values)))
+    high = float(np.nanmax(values)) * (1 + margin)
+    return low, max(high, low + 1.0)
+
+
+class HourlyHistogram:
+    # Histograma por hora do dia com bins centrados em valores fixos: memória constante,
+    # atualização incremental e merge por soma, o que permite medianas horárias aproximadas.
+    # Valores fora da faixa vão para o bin da borda e são contados em underflow/overflow
+    def __init__(self, value_range=settings.METRIC_HISTOGRAM_RANGE, bins=settings.METRIC_HISTOGRAM_BINS):
+        self.value_range = tuple(value_range)
+        self.bins = bins
+        self.centers = np.linspace(value_range[0], value_range[1], bins)
+        self.counts = np.zeros((24, bins), dtype=np.int64)
+        self.underflow = np.zeros(24, dtype=np.int64)
+        self.overflow = np.zeros(24, dtype=np.int64)
+
+    @property
+    def clipped(self):
+        return int(self.underflow.sum() + self.overflow.sum())
+
+    def update(self, hours, values):
+        hours = np.asarray(hours)
+        step = self.centers[1] - self.centers[0]
+        positions = np.rint((np.asarray(values, dtype=np.float64) - self.centers[0]) / step)
+        np.add.at(self.underflow, hours[positions < 0], 1)
+        np.add.at(self.overflow, hours[positions > self.bins - 1], 1)
+        positions = np.clip(positions, 0, self.bins - 1).astype(np.int64)
+        np.add.at(self.counts, (hours, positions), 1)
+
+    def merge(self, other):
+        if self.value_range != other.value_range or self.bins != other.bins:
+            raise ValueError("Histogramas com bins diferentes não podem ser combinados.")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+    def medians(self):
+        totals = self.counts.sum(axis=1)
+        cumulative = self.counts.cumsum(axis=1)
+        positions = (cumulative < ((totals + 1) // 2)[:, None]).sum(axis=1)
+        medians = self.centers[np.minimum(positions, self.bins - 1)]
+        return np.where(totals > 0, medians, np.nan)
+
+    def absolute_error_sum(self, predictions):
+        # Soma de |y - predictions[hora]| sobre todas as observações do histograma
+        deviation = np.abs(self.centers[None, :] - predictions[:, None])
+        return np.nansum(self.counts * deviation)
+
+
+class _ScopeAccumulator:
+    def __init__(self, value_range, bins):
+        self.n_obs = 0
+        self.abs_error = 0.0
+        self.sq_error = 0.0
+        self.y_mean = 0.0
+        self.y_m2 = 0.0
+        self.ape_sum = 0.0
+        self.ape_count = 0
+        self.sape_sum = 0.0
+        self.sape_count = 0
+        self.observed = HourlyHistogram(value_range, bins)
+        self.reference = HourlyHistogram(value_range, bins)
+
+    def update(self, y_true, y_pred, hours):
+        if len(y_true) == 0:
+            return
+
+        residual = y_true - y_pred
+        self.abs_error += np.abs(residual).sum()
+        self.sq_error += (residual**2).sum()
+
+        nonzero = y_true != 0
+        self.ape_sum += np.abs(residual[nonzero] / y_true[nonzero]).sum()
+        self.ape_count += int(nonzero.sum())
+
+        denominator = np.abs(y_pred) + np.abs(y_true)
+        valid = denominator != 0
+        self.sape_sum += (np.abs(residual[valid]) / denominator[valid]).sum()
+        self.sape_count += int(valid.sum())
+
+        self._merge_moments(len(y_true), y_true.mean(), ((y_true - y_true.mean()) ** 2).sum())
+        self.observed.update(hours, y_true)
+
+    def merge(self, other):
+        self.abs_error += other.abs_error
+        self.sq_error += other.sq_error
+        self.ape_sum += other.ape_sum
+        self.ape_count += other.ape_count
+        self.sape_sum += other.sape_sum
+        self.sape_count += other.sape_count
+        self._merge_moments(other.n_obs, other.y_mean, other.y_m2)
+        self.observed.merge(other.observed)
+        self.reference.merge(other.reference)
+
+    def _merge_moments(self, n_obs, y_mean, y_m2):
+        # Combinação de médias e somas de quadrados (Chan et al.) sem guardar as observações
+        total = self.n_obs + n_obs
+        if total == 0:
+            return
+        delta = y_mean - self.y_mean
+        self.y_mean += delta * n_obs / total
+        self.y_m2 += y_m2 + delta**2 * self.n_obs * n_obs / total
+        self.n_obs = total
+
+    def result(self):
+        if self.n_obs == 0:
+            return dict.fromkeys(["mae", "rmse", "mse", "r2", "mape", "smape", "mase"], np.nan)
+
+        mae = self.abs_error / self.n_obs
+        mse = self.sq_error / self.n_obs
+        if self.y_m2 == 0:
+            r2 = 1.0 if self.sq_error == 0 else 0.0
+        else:
+            r2 = 1 - self.sq_error / self.y_m2
+
+        naive = self.reference.medians()
+        if np.isnan(naive).all():
+            naive = self.observed.medians()
+        mae_naive = self.observed.absolute_error_sum(naive) / self.n_obs
+
+        return {
+            "mae": mae,
+            "rmse": np.sqrt(mse),
+            "mse": mse,
+            "r2": r2,
+            "mape": self.ape_sum / self.ape_count if self.ape_count else np.nan,
+            "smape": self.sape_sum / self.sape_count if self.sape_count else np.nan,
+            "mase": 0.0 if mae_naive == 0 else mae / mae_naive,
+        }
+
+
+class ForecastMetricsAccumulator:
+    # Avaliação contínua: update() a cada lote de medições, merge() para combinar estados
+    # parciais de workers e result() com as métricas gerais e diurnas (sufixo _day).
+    # O MASE usa as medianas horárias do histórico informado em update_reference(); sem
+    # histórico, usa as próprias observações. É aproximado pela resolução do histograma;
+    # value_range deve cobrir o alvo (histogram_range), valores fora dela são contados em clipped()
+    def __init__(self, value_range=settings.METRIC_HISTOGRAM_RANGE, bins=settings.METRIC_HISTOGRAM_BINS):
+        self.total = _ScopeAccumulator(value_range, bins)
+        self.day = _ScopeAccumulator(value_range, bins)
+
+    def update(self, y_true, y_pred):
+        hours = np.asarray(y_true.index.hour)
+        day = daytime_mask(y_true.index)
+        y_true = np.asarray(y_true, dtype=np.float64)
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+
+        self.total.update(y_true, y_pred, hours)
+        self.day.update(y_true[day], y_pred[day], hours[day])
+        return self
+
+    def update_reference(self, y_history):
+        hours = np.asarray(y_history.index.hour)
+        day = daytime_mask(y_history.index)
+        values = np.asarray(y_history, dtype=np.float64)
+
+        self.total.reference.update(hours, values)
+        self.day.reference.update(hours[day], values[day])
+        return self
+
+    def merge(self, other):
+        self.total.merge(other.total)
+        self.day.merge(other.day)
+        return self
+
+    def clipped(self):
+        # Observações (medições e histórico) fora da faixa do histograma
+        return self.total.observed.clipped + self.total.reference.clipped
+
+    def result(self):
+        if clipped := self.clipped():
+            logger.warning(
+                f"{clipped} valores fora da faixa {self.total.observed.value_range} do histograma; "
+                "o MASE incremental está aproximado nas bordas"
+            )
+        results = {key: float(value) for key, value in self.total.result().items()}
+        results.update({f"{key}_day": float(value) for key, value in self.day.result().items()})
+        return results
@@ -0,0 +1,527 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from config import settings
+from config.settings import IRRADIATION_FEATURES
+from metric_utils import calculate_forecast_accuracy, quantile_column, quantile_metrics
+from pages.model_ml.components.physical_model import PhysicalModel
+from utils import LRUCache, dataset_fingerprint, partition_threads
+
+MODEL_TYPES = [
+    "XGBoost",
+    "LightGBM",
+    "Physical",
+    "Direct XGBoost",
+    "Direct LightGBM",
+    "Quantile XGBoost",
+    "Quantile LightGBM",
+]
+MODEL_PARAMS = {
+    "XGBoost": {},
+    "LightGBM": {},
+    "Physical": {"model_type": "NL"},
+    "Direct XGBoost": {"horizon": settings.FORECAST_HORIZON},
+    "Direct LightGBM": {"horizon": settings.FORECAST_HORIZON},
+    "Quantile XGBoost": {"quantiles": settings.FORECAST_QUANTILES},
+    "Quantile LightGBM": {"quantiles": settings.FORECAST_QUANTILES},
+}
+# Estratégia direta: um booster da biblioteca base por horizonte
+DIRECT_MODELS = {
+    "Direct XGBoost": "XGBoost",
+    "Direct LightGBM": "LightGBM",
+}
+# Previsão probabilística: quantis (P10/P50/P90) da biblioteca base
+QUANTILE_MODELS = {
+    "Quantile XGBoost": "XGBoost",
+    "Quantile LightGBM": "LightGBM",
+}
+DEFAULT_N_ESTIMATORS = 100
+# feature_pre_filter desligado: um Dataset já construído serve para qualquer min_child_samples
+LIGHTGBM_DATASET_PARAMS = {"feature_pre_filter": False, "verbose": -1}
+
+# Bins por biblioteca e conjunto de features (BinnedReference), compartilhados pelos treinos sobre
+# as mesmas linhas: modelos do torneio, reexecuções e o mesmo fold em outro modelo do backtest
+BINNED_REFERENCES = LRUCache(maxsize=settings.BINNED_REFERENCE_CACHE_SIZE)
+_reference_locks = {}
+_references_lock = threading.Lock()
+
+
+class TrainingCancelled(Exception):
+    pass
+
+
+class DirectModel:
+    # estimators[h - 1] prevê o alvo h - 1 horas após a linha de origem, usando apenas as
+    # features dessa linha; predict devolve o bloco (origens, horizonte) de uma vez
+    def __init__(self, model_type, estimators):
+        self.model_type = model_type
+        self.estimators = estimators
+
+    @property
+    def horizon(self):
+        return len(self.estimators)
+
+    def predict(self, x):
+        return np.column_stack([predict_features(estimator, x) for estimator in self.estimators])
+
+
+class QuantileModel:
+    # predict devolve (linhas, quantis) em ordem crescente; estimators tem um booster multi-saída
+    # (XGBoost) ou um booster por quantil (LightGBM)
+    def __init__(self, model_type, estimators, quantiles):
+        self.model_type = model_type
+        self.estimators = estimators
+        self.quantiles = list(quantiles)
+
+    def predict(self, x):
+        block = np.column_stack(
+            [np.asarray(predict_features(estimator, x)).reshape(len(x), -1) for estimator in self.estimators]
+        )
+        # Quantis ajustados separadamente podem se cruzar; ordenar cada linha garante P10 <= P50 <= P90
+        return np.sort(block, axis=1)
+
+
+class PhysicalEstimator:
+    # PhysicalModel ajustado e as colunas de irradiação/temperatura, na ordem usada no ajuste
+    def __init__(self, model, columns):
+        self.model = model
+        self.columns = list(columns)
+
+    def predict(self, x):
+        return self.model.predict(x[self.columns].values.T)
+
+
+class XGBoostProgress(xgb.callback.TrainingCallback):
+    # Informa o progresso por rodada e interrompe o treino quando o cancelamento é pedido
+    def __init__(self, n_rounds, progress=None, cancel_event=None):
+        super().__init__()
+        self.n_rounds = n_rounds
+        self.progress = progress
+        self.cancel_event = cancel_event
+
+    def after_iteration(self, model, epoch, evals_log):
+        if self.progress is not None:
+            self.progress((epoch + 1) / self.n_rounds)
+        return is_cancelled(self.cancel_event)
+
+
+def lightgbm_progress(progress=None, cancel_event=None):
+    def callback(env):
+        if progress is not None:
+            total = env.end_iteration - env.begin_iteration
+            progress((env.iteration - env.begin_iteration + 1) / total)
+        if is_cancelled(cancel_event):
+            raise TrainingCancelled()
+
+    return callback
+
+
+def is_cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+
+def split_xy(df, target):
+    return df.drop(columns=[target]), df[target]
+
+
+class BinnedDatasets:
+    # Datasets já binados (QuantileDMatrix, lgb.Dataset) de um recorte fixo, reaproveitados entre
+    # treinos que mudam apenas os hiperparâmetros (rungs da busca). A chave é o identificador do
+    # recorte dado por quem chama; o lgb.train altera o Dataset, então cada thread tem os seus
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, key, build):
+        datasets = self._local.__dict__.setdefault("datasets", {})
+        if key not in datasets:
+            datasets[key] = build()
+        return datasets[key]
+
+
+class BinnedReference:
+    # Bins calculados uma única vez sobre x e usados pelos datasets de recortes das mesmas linhas
+    # (um por horizonte do modelo direto): cada recorte só troca o rótulo e quantiza suas linhas.
+    # A construção sobre a referência compartilhada é serializada; os treinos seguem em paralelo
+    def __init__(self, model_type, x):
+        self.model_type = model_type
+        self._lock = threading.Lock()
+        if model_type == "XGBoost":
+            self.dataset = xgb.QuantileDMatrix(x)
+        else:
+            self.dataset = lgb.Dataset(x, params=LIGHTGBM_DATASET_PARAMS).construct()
+
+    def build(self, x, y):
+        with self._lock:
+            if self.model_type == "XGBoost":
+                return xgb.QuantileDMatrix(x, y, ref=self.dataset)
+            return lgb.Dataset(x, y, reference=self.dataset, params=LIGHTGBM_DATASET_PARAMS).construct()
+
+
+def binned_reference(model_type, x):
+    # Chave pelo fingerprint das features (colunas, índice do recorte e valores); cada treino
+    # continua com o seu próprio Dataset, construído sobre os bins da referência
+    key = (model_type, dataset_fingerprint(x))
+    with _references_lock:
+        lock = _reference_locks.setdefault(key, threading.Lock())
+
+    # Treinos simultâneos sobre o mesmo x (torneio) esperam uma única construção
+    with lock:
+        reference = BINNED_REFERENCES.get(key)
+        if reference is None:
+            reference = BinnedReference(model_type, x)
+            BINNED_REFERENCES.put(key, reference)
+
+    with _references_lock:
+        _reference_locks.pop(key, None)
+    return reference
+
+
+def xgboost_datasets(x_train, y_train, eval_set, datasets=None, reference=None):
+    # Conjuntos de avaliação usam os quantis do treino (ref), como o XGBRegressor faz internamente
+    def get(key, build):
+        return build() if datasets is None else datasets.get(("xgboost", key), build)
+
+    def build_train():
+        if reference is not None:
+            return reference.build(x_train, y_train)
+        return xgb.QuantileDMatrix(x_train, y_train)
+
+    dtrain = get("train", build_train)
+    evals = [
+        dtrain if x is x_train else get(f"valid{i}", lambda x=x, y=y: xgb.QuantileDMatrix(x, y, ref=dtrain))
+        for i, (x, y) in enumerate(eval_set)
+    ]
+    return dtrain, evals
+
+
+def lightgbm_datasets(x_train, y_train, eval_set, datasets=None, reference=None):
+    # Sem reaproveitamento nem referência o lgb.train constrói o Dataset com os parâmetros do treino
+    if datasets is None:
+        if reference is not None:
+            dtrain, params = reference.build(x_train, y_train), LIGHTGBM_DATASET_PARAMS
+        else:
+            dtrain, params = lgb.Dataset(x_train, y_train, params={"verbose": -1}), None
+        return dtrain, [
+            dtrain if x is x_train else lgb.Dataset(x, y, reference=dtrain, params=params) for x, y in eval_set
+        ]
+
+    # Reaproveitado, o Dataset é construído uma vez e mantém os dados brutos
+    def build(x, y, train=None):
+        return lgb.Dataset(x, y, reference=train, params=LIGHTGBM_DATASET_PARAMS, free_raw_data=False).construct()
+
+    dtrain = datasets.get(("lightgbm", "train"), lambda: build(x_train, y_train))
+    valid_sets = [
+        dtrain if x is x_train else datasets.get(("lightgbm", f"valid{i}"), lambda x=x, y=y: build(x, y, dtrain))
+        for i, (x, y) in enumerate(eval_set)
+    ]
+    return dtrain, valid_sets
+
+
+def fit_xgboost(
+    x_train,
+    y_train,
+    eval_set=None,
+    n_jobs=None,
+    progress=None,
+    cancel_event=None,
+    verbose=None,
+    evals_result=None,
+    datasets=None,
+    reference=None,
+    **params
+):
+    n_rounds = params.pop("n_estimators", None) or DEFAULT_N_ESTIMATORS
+    callbacks = None
+    if progress is not None or cancel_event is not None:
+        callbacks = [XGBoostProgress(n_rounds, progress, cancel_event)]
+
+    if datasets is None and reference is None:
+        reference = binned_reference("XGBoost", x_train)
+    dtrain, dvalid = xgboost_datasets(x_train, y_train, eval_set or [], datasets, reference)
+    evals = [(dataset, f"validation_{i}") for i, dataset in enumerate(dvalid)]
+    params = {"objective": "reg:squarederror", "nthread": n_jobs, **params}
+
+    model = xgb.train(
+        {key: value for key, value in params.items() if value is not None},
+        dtrain,
+        num_boost_round=n_rounds,
+        evals=evals,
+        evals_result=evals_result,
+        verbose_eval=bool(evals) if verbose is None else verbose,
+        callbacks=callbacks,
+    )
+    if is_cancelled(cancel_event):
+        raise TrainingCancelled()
+    return model
+
+
+def fit_lightgbm(
+    x_train,
+    y_train,
+    eval_set=None,
+    n_jobs=None,
+    progress=None,
+    cancel_event=None,
+    evals_result=None,
+    datasets=None,
+    reference=None,
+    **params
+):
+    n_rounds = params.pop("n_estimators", None) or DEFAULT_N_ESTIMATORS
+    callbacks = []
+    if progress is not None or cancel_event is not None:
+        callbacks.append(lightgbm_progress(progress, cancel_event))
+    if evals_result is not None:
+        callbacks.append(lgb.record_evaluation(evals_result))
+
+    if datasets is None and reference is None:
+        reference = binned_reference("LightGBM", x_train)
+    dtrain, valid_sets = lightgbm_datasets(x_train, y_train, eval_set or [], datasets, reference)
+    params = {"objective": "regression", "n_jobs": n_jobs, **params}
+
+    return lgb.train(
+        {key: value for key, value in params.items() if value is not None},
+        dtrain,
+        num_boost_round=n_rounds,
+        valid_sets=valid_sets,
+        callbacks=callbacks,
+    )
+
+
+def physical_columns(columns):
+    # O modelo físico usa apenas irradiação e temperatura; 'gti' é redundante quando há 'ghi'
+    errors = []
+    if "air_temp" not in columns:
+        errors.append("O modelo físico requer recurso: 'air_temp'")
+    if "ghi" not in columns and "gti" not in columns:
+        errors.append("O modelo físico requer recurso:'ghi' ou 'gti'")
+    if errors:
+        raise ValueError("\n".join(errors))
+
+    selected = [col for col in columns if col in IRRADIATION_FEATURES]
+    if "ghi" in selected and "gti" in selected:
+        selected.remove("gti")
+    return selected
+
+
+def fit_physical(df_train, target, model_type="NL"):
+    columns = physical_columns(df_train.columns)
+    model = PhysicalModel(model_type)
+    model.fit(df_train[columns].values.T, df_train[target].values)
+    return PhysicalEstimator(model, columns)
+
+
+def horizon_views(x, y, horizon):
+    # Pares (features da origem, alvo h - 1 horas depois) como deslocamentos sobre os mesmos
+    # arrays: x.iloc[:n - offset] e y[offset:] são views, nenhum conjunto é copiado
+    values = y.to_numpy()
+    n_rows = len(x)
+    for offset in range(horizon):
+        x_h = x.iloc[: n_rows - offset]
+        yield x_h, pd.Series(values[offset:], index=x_h.index, name=y.name, copy=False)
+
+
+def fit_concurrently(fit, tasks, n_jobs=None, progress=None, cancel_event=None):
+    # Treinos independentes (x, y, params) em paralelo; n_jobs é o total de threads,
+    # repartido entre os treinos simultâneos
+    n_cores = n_jobs or os.cpu_count() or 1
+    n_workers = min(len(tasks), n_cores)
+    threads = partition_threads(n_workers, n_cores)
+
+    lock = threading.Lock()
+    model_progress = [0.0] * len(tasks)
+
+    def update(idx, value):
+        with lock:
+            model_progress[idx] = value
+            if progress is not None:
+                progress(sum(model_progress) / len(tasks))
+
+    def run(idx, x, y, params):
+        return fit(
+            x,
+            y,
+            n_jobs=threads,
+            progress=lambda value: update(idx, value),
+            cancel_event=cancel_event,
+            **params,
+        )
+
+    with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="fit") as executor:
+        futures = [executor.submit(run, idx, *task) for idx, task in enumerate(tasks)]
+        try:
+            return [future.result() for future in futures]
+        except TrainingCancelled:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+def fit_direct(
+    model_type,
+    x_train,
+    y_train,
+    horizon=settings.FORECAST_HORIZON,
+    n_jobs=None,
+    progress=None,
+    cancel_event=None,
+    **params
+):
+    if len(x_train) <= horizon:
+        raise ValueError("Conjunto de treino menor que o horizonte.")
+
+    fit = fit_xgboost if model_type == "XGBoost" else fit_lightgbm
+    # Os horizontes são recortes das mesmas linhas: o treino completo é binado uma vez
+    reference = binned_reference(model_type, x_train)
+    tasks = [(x_h, y_h, {**params, "reference": reference}) for x_h, y_h in horizon_views(x_train, y_train, horizon)]
+    estimators = fit_concurrently(fit, tasks, n_jobs=n_jobs, progress=progress, cancel_event=cancel_event)
+    return DirectModel(model_type, estimators)
+
+
+def fit_quantile(
+    model_type,
+    x_train,
+    y_train,
+    quantiles=settings.FORECAST_QUANTILES,
+    n_jobs=None,
+    progress=None,
+    cancel_event=None,
+    **params
+):
+    # XGBoost ajusta todos os quantis num único booster multi-saída (reg:quantileerror);
+    # o LightGBM só aceita um alpha por modelo, então os quantis são treinados em paralelo
+    quantiles = sorted(quantiles)
+    if model_type == "XGBoost":
+        estimator = fit_xgboost(
+            x_train,
+            y_train,
+            n_jobs=n_jobs,
+            progress=progress,
+            cancel_event=cancel_event,
+            **{**params, "objective": "reg:quantileerror", "quantile_alpha": quantiles},
+        )
+        return QuantileModel(model_type, [estimator], quantiles)
+
+    tasks = [(x_train, y_train, {**params, "objective": "quantile", "alpha": quantile}) for quantile in quantiles]
+    estimators = fit_concurrently(fit_lightgbm, tasks, n_jobs=n_jobs, progress=progress, cancel_event=cancel_event)
+    return QuantileModel(model_type, estimators, quantiles)
+
+
+def predict_direct(model, df_test, target):
+    # Blocos consecutivos de H horas: cada origem (primeira linha do bloco) recebe as H previsões
+    # numa única chamada, cobrindo todo o período de teste sem sobreposição
+    x_test = df_test.drop(columns=[target])
+    positions = np.arange(0, len(df_test), model.horizon)
+    block = model.predict(x_test.iloc[positions])
+
+    rows = (positions[:, None] + np.arange(model.horizon)).ravel()
+    horizons = np.tile(np.arange(1, model.horizon + 1), len(positions))
+    keep = rows < len(df_test)
+    rows = rows[keep]
+
+    df_pred = pd.DataFrame({"y_pred": block.ravel()[keep]}, index=df_test.index[rows])
+    df_pred["y_true"] = df_test[target].iloc[rows].to_numpy()
+    df_pred["origin"] = np.repeat(df_test.index[positions], model.horizon)[keep]
+    df_pred["horizon"] = horizons[keep]
+    return df_pred
+
+
+def fit_model(model_type, df_train, target, n_jobs=None):
+    if model_type in DIRECT_MODELS:
+        params = MODEL_PARAMS[model_type]
+        return fit_direct(DIRECT_MODELS[model_type], *split_xy(df_train, target), n_jobs=n_jobs, **params)
+    if model_type in QUANTILE_MODELS:
+        params = MODEL_PARAMS[model_type]
+        return fit_quantile(QUANTILE_MODELS[model_type], *split_xy(df_train, target), n_jobs=n_jobs, **params)
+    if model_type == "XGBoost":
+        return fit_xgboost(*split_xy(df_train, target), n_jobs=n_jobs)
+    if model_type == "LightGBM":
+        return fit_lightgbm(*split_xy(df_train, target), n_jobs=n_jobs, verbose=-1)
+    if model_type == "Physical":
+        return fit_physical(df_train, target)
+    raise ValueError(f"Unsupported model type: {model_type}")
+
+
+def train_evaluate(model_type, df_train, df_test, target, params=None, progress=None, cancel_event=None, n_jobs=None):
+    # Treino e avaliação sem Streamlit: pode rodar em uma thread de job em segundo plano
+    params = MODEL_PARAMS.get(model_type, {}) if params is None else params
+    if model_type in ("XGBoost", "LightGBM"):
+        fit = fit_xgboost if model_type == "XGBoost" else fit_lightgbm
+        x_train, y_train = split_xy(df_train, target)
+        x_test, y_test = split_xy(df_test, target)
+        model = fit(
+            x_train,
+            y_train,
+            eval_set=[(x_train, y_train), (x_test, y_test)],
+            n_jobs=n_jobs,
+            progress=progress,
+            cancel_event=cancel_event,
+            **params,
+        )
+    elif model_type in DIRECT_MODELS:
+        model = fit_direct(
+            DIRECT_MODELS[model_type],
+            *split_xy(df_train, target),
+            n_jobs=n_jobs,
+            progress=progress,
+            cancel_event=cancel_event,
+            **params,
+        )
+    elif model_type in QUANTILE_MODELS:
+        model = fit_quantile(
+            QUANTILE_MODELS[model_type],
+            *split_xy(df_train, target),
+            n_jobs=n_jobs,
+            progress=progress,
+            cancel_event=cancel_event,
+            **params,
+        )
+    elif model_type == "Physical":
+        # curve_fit não é interrompível: o cancelamento só é verificado antes e depois do ajuste
+        if is_cancelled(cancel_event):
+            raise TrainingCancelled()
+        model = fit_physical(df_train, target, **params)
+        if is_cancelled(cancel_event):
+            raise TrainingCancelled()
+    else:
+        raise ValueError(f"Unsupported model type: {model_type}")
+
+    df_pred = predict_model(model, df_test, target)
+    metrics = calculate_forecast_accuracy(df_pred["y_true"], df_pred["y_pred"], df_train[target])
+    if isinstance(model, QuantileModel):
+        metrics.update(quantile_metrics(df_pred, model.quantiles))
+    if progress is not None:
+        progress(1.0)
+    return {"estimator": model, "df_pred": df_pred, "metrics": metrics}
+
+
+def predict_features(model, x):
+    if isinstance(model, xgb.Booster):
+        return model.inplace_predict(x)
+    return model.predict(x)
+
+
+def predict_model(model, df_test, target):
+    if isinstance(model, DirectModel):
+        return predict_direct(model, df_test, target)
+    if isinstance(model, QuantileModel):
+        return predict_quantiles(model, df_test, target)
+
+    y_pred = predict_features(model, df_test.drop(columns=[target]))
+    df_pred = pd.DataFrame(y_pred, index=df_test.index, columns=["y_pred"])
+    df_pred["y_true"] = df_test[target]
+    return df_pred
+
+
+def predict_quantiles(model, df_test, target):
+    # Uma coluna y_pXX por quantil; y_pred é o quantil central (P50)
+    block = model.predict(df_test.drop(columns=[target]))
+    columns = [quantile_column(quantile) for quantile in model.quantiles]
+    df_pred = pd.DataFrame(block, index=df_test.index, columns=columns)
+    df_pred.insert(0, "y_pred", block[:, len(columns) // 2])
+    df_pred["y_true"] = df_test[target]
+    return df_pred
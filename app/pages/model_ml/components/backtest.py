@@ -0,0 +1,114 @@
+import os
+
+import plotly.graph_objects as go
+import streamlit as st
+from backtest_utils import WINDOW_TYPES, make_folds, run_backtest
+from utils import partition_threads
+
+WINDOW_LABELS = {"expanding": "Expansiva", "sliding": "Deslizante"}
+
+
+def show_backtest(datasets, target, model):
+    df_features = datasets["df_features"]
+    df_train = datasets["df_train"]
+    df_test = datasets["df_test"]
+
+    st.write("#### Backtest walk-forward (origem móvel)")
+    st.caption(
+        "O primeiro fold usa a data de corte da divisão treino/teste; a cada passo a origem avança e o "
+        "modelo é re-treinado com os dados anteriores à origem."
+    )
+
+    cols = st.columns(4)
+    window = cols[0].radio("Janela de treino", WINDOW_TYPES, format_func=WINDOW_LABELS.get)
+    horizon = cols[1].number_input("Horizonte (horas)", min_value=1, max_value=24 * 31, value=24)
+    step = cols[2].number_input("Passo entre origens (horas)", min_value=1, max_value=24 * 31, value=24)
+    n_folds = cols[3].number_input("Número de folds (0 = todos)", min_value=0, max_value=1000, value=0)
+
+    cols = st.columns(4)
+    train_days = cols[0].number_input(
+        "Tamanho do treino (dias)", min_value=1, max_value=3650, value=90, disabled=window == "expanding"
+    )
+    n_cores = os.cpu_count() or 1
+    n_workers = cols[1].number_input("Processos", min_value=1, max_value=n_cores, value=n_cores)
+    cols[2].metric("Threads por processo", partition_threads(n_workers, n_cores))
+
+    folds = make_folds(
+        df_features.index,
+        first_origin=df_test.index[0],
+        horizon=horizon,
+        step=step,
+        n_folds=n_folds or None,
+        window=window,
+        train_size=train_days * 24,
+        start=df_train.index[0],
+    )
+    cols[3].metric("Folds", len(folds))
+
+    if not folds:
+        st.error("Nenhum fold cabe no período de teste com o horizonte escolhido.")
+        return None
+
+    if not st.button(f"🧪  Iniciar Backtest: {model}"):
+        st.warning("Clique em iniciar backtest.")
+        return None
+
+    progress_bar = st.progress(0.0, text="Executando folds...")
+
+    def progress(done, total):
+        progress_bar.progress(done / total, text=f"Folds concluídos: {done}/{total}")
+
+    try:
+        df_pred, summary = run_backtest(df_features, target, model, folds, n_workers=n_workers, progress=progress)
+    except ValueError as e:
+        st.error(str(e))
+        return None
+    finally:
+        progress_bar.empty()
+
+    show_backtest_results(df_pred, summary, model)
+    return df_pred, summary
+
+
+def show_backtest_results(df_pred, summary, model):
+    st.write(f"### Resultados do backtest - {model}")
+
+    df_total = summary["total"]
+    cols = st.columns(4)
+    for col, key in zip(cols, ["mae", "rmse", "r2", "mase"]):
+        col.metric(
+            label=f"{key.upper()}",
+            label_visibility="collapsed",
+            value=round(float(df_total[key].iloc[0]), 4),
+            delta=f"{key.upper()}",
+            delta_color="normal"
+        )
+
+    df_errors = summary["errors"]
+    if not df_errors.empty:
+        st.warning(f"{len(df_errors)} fold(s) não puderam ser treinados e ficaram fora das métricas.")
+        with st.expander("Folds com erro"):
+            st.dataframe(df_errors, use_container_width=True)
+
+    df_folds = summary["folds"]
+    graph = [
+        go.Scatter(
+            x=df_folds["origin"], y=df_folds["mae"], mode="lines+markers", name="MAE", line=dict(color="darkcyan")
+        ),
+        go.Scatter(
+            x=df_folds["origin"], y=df_folds["rmse"], mode="lines+markers", name="RMSE", line=dict(color="coral")
+        ),
+    ]
+    layout = dict(
+        height=400,
+        title={"text": "Erro por origem do backtest", "x": 0.5, "xanchor": "center"},
+        yaxis=dict(title="Erro (kWh)"),
+        xaxis=dict(title="Origem", type="date"),
+    )
+    st.plotly_chart(go.Figure(data=graph, layout=layout), use_container_width=True)
+
+    with st.expander("Métricas por fold"):
+        st.dataframe(df_folds.round(4), use_container_width=True)
+
+    with st.expander("Previsões do backtest"):
+        st.dataframe(df_pred, use_container_width=True)
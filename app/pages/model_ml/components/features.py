@@ -1,5 +1,6 @@
 import pandas as pd
 import streamlit as st
+from feature_utils import create_features_cached
 from config.settings import (
     CYCLIC_FEATURES,
     IRRADIATION_FEATURES,
@@ -34,14 +35,12 @@ def display_data_summary(df_selected, target, features):
             st.dataframe(df_selected[features].head(4), hide_index=True)
 
 
-def select_features(df_features_all, target, df_rad_tempook, df_rad_solcast):
+def select_features(df_target, target, df_rad_tempook, df_rad_solcast):
     if 'features' not in st.session_state:
         st.session_state.features = []
     if 'df_selected' not in st.session_state:
         st.session_state.df_selected = None
 
-    df = df_features_all.copy()
-
     with st.expander("1. Seleção de Recursos", expanded=True):
         st.markdown("### A) Recursos Internos")
 
@@ -59,6 +58,9 @@ def select_features(df_features_all, target, df_rad_tempook, df_rad_solcast):
         for idx, (title, options) in enumerate(feature_sets):
             features.extend(select_feature_group(title, options, cols[idx % len(cols)]))
 
+        # Apenas as features selecionadas (e suas dependências) são calculadas
+        df = create_features_cached(df_target, target, features=features)
+
         st.markdown("### B) Recursos Externos")
 
         cols = st.columns(3)
@@ -0,0 +1,367 @@
+import plotly.graph_objects as go
+import streamlit as st
+from config import settings
+from forecast_utils import forecast_origins, horizon_metrics, recursive_forecast
+from metric_utils import bootstrap_metrics, error_breakdown
+from pages.model_ml.components.train_model import plot_feature_importance
+from utils import dataset_fingerprint
+
+BREAKDOWN_LABELS = {
+    "hour": "Hora do dia",
+    "month": "Mês",
+    "weekday": "Dia da semana",
+    "inverter": "Inversor",
+}
+
+
+def show_results(experiment, n_resamples, block_size):
+    model = experiment["model"]
+    target = experiment["target"]
+    df_pred = experiment["df_pred"]
+    y_train = experiment["y_train"]
+
+    st.write(f"### Resultados: Previsão de Produção de Energia - {model}")
+    if experiment.get("cached"):
+        st.caption(f"Alvo: {target} | resultado carregado do registro de modelos ({experiment['key'][:8]})")
+    else:
+        st.caption(f"Alvo: {target} | tempo de treino: {experiment['elapsed']:.1f}s")
+    for note in experiment["notes"]:
+        st.info(note)
+
+    if model != "Physical":
+        plot_feature_importance(experiment["estimator"])
+
+    cols = st.columns(4)
+    for col, (key, value) in zip(cols, experiment["metrics"].items()):
+        col.metric(
+            label=f"{key.upper()}",
+            label_visibility="collapsed",
+            value=round(value, 4),
+            delta=f"{key.upper()}",
+            delta_color="normal"
+        )
+
+    quantile_metrics = {
+        key: value for key, value in experiment["metrics"].items() if key.startswith(("pinball", "coverage"))
+    }
+    if quantile_metrics:
+        cols = st.columns(4)
+        for col, (key, value) in zip(cols, quantile_metrics.items()):
+            label = key.replace("pinball_", "Pinball ").replace("coverage_", "Cobertura ").upper()
+            value = f"{value:.1%}" if key.startswith("coverage") else round(value, 4)
+            col.metric(label=label, value=value)
+
+    show_confidence_intervals(df_pred, y_train, n_resamples, block_size)
+    show_prediction_graph(df_pred, model)
+    show_error_breakdown(model, target, df_pred, y_train)
+
+
+def show_tournament_results(tournament):
+    results = tournament["results"]
+    st.write(f"### Resultados do torneio: {tournament['target']}")
+    st.caption(f"Tempo total: {tournament['elapsed']:.1f}s")
+    for model_type, error in tournament["errors"].items():
+        st.error(f"Erro ao treinar o modelo {model_type}:\n{error}")
+    if not results:
+        return
+
+    df_comparison = tournament["comparison"]
+    lower_is_better = [col for col in df_comparison.columns if not col.startswith("r2") and col != "tempo (s)"]
+    st.dataframe(
+        df_comparison.style.format("{:.4f}")
+        .highlight_min(subset=lower_is_better, color="darkgreen")
+        .highlight_max(subset=[col for col in df_comparison.columns if col.startswith("r2")], color="darkgreen"),
+        use_container_width=True,
+    )
+
+    df_true = next(iter(results.values()))["df_pred"]
+    graph = [
+        go.Scatter(x=df_true.index, y=df_true["y_true"], mode='lines', line=dict(color="darkcyan"), name='test set')
+    ]
+    for model_type, result in results.items():
+        df_pred = result["df_pred"]
+        graph.append(go.Scatter(x=df_pred.index, y=df_pred["y_pred"], mode='lines', name=model_type))
+
+    layout = dict(
+        height=600,
+        title={"text": "Produção de Energia: comparação dos modelos", "x": 0.5, "xanchor": "center"},
+        yaxis=dict(title="Produção de Energia (kWh)"),
+        xaxis=dict(title="", type='date', rangeslider=dict(visible=True)),
+    )
+    st.plotly_chart(go.Figure(data=graph, layout=layout), use_container_width=True)
+
+
+def show_fleet_results(fleet):
+    st.write(f"### Resultados da frota: {fleet['model']}")
+    for target, error in fleet["errors"].items():
+        st.error(f"Erro ao treinar o medidor {target}:\n{error}")
+
+    cols = st.columns(4)
+    cols[0].metric("Modelos", fleet["n_models"])
+    cols[1].metric("Treinados (fora do registro)", fleet["n_trained"])
+    cols[2].metric("Tempo total", f"{fleet['fleet_elapsed']:.1f}s")
+    cols[3].metric("Vazão", f"{fleet['models_per_min']:.1f} modelos/min")
+
+    df_metrics = fleet["metrics"]
+    if df_metrics.empty:
+        return
+
+    metric_cols = [col for col in df_metrics.columns if col != "cached"]
+    st.dataframe(df_metrics.style.format("{:.4f}", subset=metric_cols), use_container_width=True)
+
+    graph = [go.Bar(x=df_metrics.index, y=df_metrics["mae"], name="MAE", marker_color="darkcyan")]
+    graph.append(go.Bar(x=df_metrics.index, y=df_metrics["rmse"], name="RMSE", marker_color="coral"))
+    layout = dict(
+        height=400,
+        barmode="group",
+        title={"text": "Erro por medidor", "x": 0.5, "xanchor": "center"},
+        xaxis=dict(title="Medidor", type="category"),
+        yaxis=dict(title="Erro (kWh)"),
+    )
+    st.plotly_chart(go.Figure(data=graph, layout=layout), use_container_width=True)
+
+    if fleet.get("breakdown"):
+        show_breakdown_tabs(fleet["breakdown"])
+
+
+def show_search_results(search):
+    df_trials = search["trials"]
+    st.write(f"### Busca de hiperparâmetros: {search['model']}")
+    st.caption(
+        f"{len(df_trials)} trials em {search['search_elapsed']:.1f}s | "
+        "score: último valor da métrica de validação (cauda do treino) no eval_set"
+    )
+
+    cols = st.columns([1, 2])
+    with cols[0]:
+        st.markdown("##### Melhor configuração")
+        st.json(search["best_params"])
+    with cols[1]:
+        graph = [
+            go.Scatter(
+                x=df_trials["n_estimators"],
+                y=df_trials["score"],
+                mode="markers",
+                marker=dict(color=df_trials["rung"], colorscale="Viridis", size=9),
+                text=df_trials["config"].map(lambda config: f"config {config}"),
+                name="trials",
+            )
+        ]
+        layout = dict(
+            height=400,
+            title={"text": "Score de validação por rung", "x": 0.5, "xanchor": "center"},
+            xaxis=dict(title="Rodadas de boosting", type="log"),
+            yaxis=dict(title="Score de validação"),
+        )
+        st.plotly_chart(go.Figure(data=graph, layout=layout), use_container_width=True)
+
+    with st.expander("Trials"):
+        st.dataframe(df_trials.sort_values(["rung", "score"], ascending=[False, True]), use_container_width=True)
+
+
+def show_prediction_graph(df_pred, model):
+    # Faixa entre o menor e o maior quantil, quando o modelo é probabilístico
+    band = [col for col in df_pred.columns if col.startswith("y_p") and col[3:].isdigit()]
+    band = sorted(band, key=lambda col: int(col[3:]))
+    graph = []
+    if len(band) > 1:
+        graph += [
+            go.Scatter(
+                x=df_pred.index,
+                y=df_pred[band[-1]],
+                mode='lines',
+                line=dict(width=0),
+                showlegend=False,
+                hoverinfo='skip',
+            ),
+            go.Scatter(
+                x=df_pred.index,
+                y=df_pred[band[0]],
+                mode='lines',
+                line=dict(width=0),
+                fill='tonexty',
+                fillcolor="rgba(255, 127, 80, 0.25)",
+                name=f"{band[0][2:].upper()}-{band[-1][2:].upper()}"
+            ),
+        ]
+    graph += [
+        go.Scatter(
+            x=df_pred.index,
+            y=df_pred["y_true"],
+            mode='lines',
+            line=dict(color="darkcyan"),
+            name='test set'
+        ),
+
+        go.Scatter(
+            x=df_pred.index,
+            y=df_pred["y_pred"],
+            mode='lines',
+            line=dict(color="coral"),
+            name='predict'
+        )
+    ]
+    layout = dict(
+        height=600,
+        title={
+            "text": f"Produção de Energia: previsão com modelo {model}",
+            "y": 0.9,
+            "x": 0.5,
+            "xanchor": "center",
+            "yanchor": "top",
+            "font": {"size": 20}
+        },
+        yaxis=dict(title="Produção de Energia (kWh)"),
+        xaxis=dict(
+            title="",
+            type='date',
+            rangeslider=dict(visible=True),
+            rangeselector=dict(
+                buttons=[
+                    dict(count=1, label='1d', step='day', stepmode='backward'),
+                    dict(count=3, label='3d', step='day', stepmode='backward'),
+                    dict(count=7, label='1s', step='day', stepmode='backward'),
+                    dict(step='all'),
+                ],
+                font=dict(size=13),
+                bordercolor="#0072B2",
+                borderwidth=1,
+                activecolor="#0072B2",
+            ),
+        ),
+    )
+    fig = go.Figure(data=graph, layout=layout)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def show_confidence_intervals(df_pred, y_train, n_resamples, block_size, confidence=0.95):
+    with st.expander(f"Intervalos de confiança ({confidence:.0%}) - bootstrap em blocos", expanded=True):
+        df_ci = bootstrap_metrics(
+            df_pred["y_true"],
+            df_pred["y_pred"],
+            y_train,
+            n_resamples=n_resamples,
+            block_size=block_size,
+            confidence=confidence,
+        )
+        df_ci.index = df_ci.index.str.upper()
+        df_ci.columns = ["Valor", "IC inferior", "IC superior"]
+
+        st.caption(f"{n_resamples} reamostragens com blocos de {block_size} horas do conjunto de teste")
+        st.dataframe(df_ci.round(4), use_container_width=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=settings.FEATURE_CACHE_SIZE)
+def get_error_breakdown(cache_key, _df_pred, _y_train):
+    # cache_key (result_cache_key) identifica o resultado; os DataFrames não são hasheados pelo Streamlit
+    return error_breakdown(_df_pred, _y_train)
+
+
+def result_cache_key(model, target, df_pred, y_train):
+    # Chave dos caches de exibição (modelo, alvo e fingerprints das previsões e do treino);
+    # não confundir com registry_utils.experiment_key, a chave do registro de modelos
+    return (model, target, dataset_fingerprint(df_pred), dataset_fingerprint(y_train.to_frame()))
+
+
+def show_error_breakdown(model, target, df_pred, y_train):
+    show_breakdown_tabs(get_error_breakdown(result_cache_key(model, target, df_pred, y_train), df_pred, y_train))
+
+
+def show_breakdown_tabs(breakdown):
+    st.write("#### Erros por grupo")
+    tabs = st.tabs([BREAKDOWN_LABELS[key] for key in breakdown])
+    for tab, (key, df_group) in zip(tabs, breakdown.items()):
+        with tab:
+            labels = df_group.index.astype(str)
+            graph = [
+                go.Bar(x=labels, y=df_group["mae"], name="MAE", marker_color="darkcyan"),
+                go.Bar(x=labels, y=df_group["rmse"], name="RMSE", marker_color="coral"),
+            ]
+            layout = dict(
+                height=400,
+                barmode="group",
+                title={"text": f"Erro por {BREAKDOWN_LABELS[key].lower()}", "x": 0.5, "xanchor": "center"},
+                xaxis=dict(title=BREAKDOWN_LABELS[key], type="category"),
+                yaxis=dict(title="Erro (kWh)"),
+            )
+            st.plotly_chart(go.Figure(data=graph, layout=layout), use_container_width=True)
+            st.dataframe(df_group.round(4), use_container_width=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=settings.FEATURE_CACHE_SIZE)
+def get_recursive_forecast(cache_key, horizon, _model, _df_features, target, _df_pred):
+    origins = forecast_origins(_df_features.index, _df_pred.index[0], _df_pred.index[-1], horizon)
+    return recursive_forecast(_model, _df_features, target, origins, horizon)
+
+
+def show_recursive_forecast(experiment):
+    # Avaliação day-ahead: os lags e janelas do alvo são realimentados com as próprias previsões,
+    # em vez dos valores verdadeiros usados na avaliação um passo à frente
+    model = experiment["model"]
+    target = experiment["target"]
+    df_pred = experiment["df_pred"]
+    y_train = experiment["y_train"]
+
+    st.write("#### Previsão recursiva day-ahead")
+    horizon = st.number_input(
+        "Horizonte (horas)",
+        min_value=1,
+        max_value=settings.FORECAST_MAX_HORIZON,
+        value=settings.FORECAST_HORIZON,
+    )
+    if not st.toggle("Avaliar previsão recursiva", False):
+        return
+
+    with st.spinner("Calculando previsão recursiva..."):
+        df_forecast = get_recursive_forecast(
+            result_cache_key(model, target, df_pred, y_train),
+            horizon,
+            experiment["estimator"],
+            experiment["df_features"],
+            target,
+            df_pred,
+        )
+    if df_forecast.empty:
+        st.warning("O período de teste não comporta nenhuma origem com o horizonte escolhido.")
+        return
+
+    df_metrics = horizon_metrics(df_forecast, y_train, oracle=df_pred["y_pred"])
+    st.caption(
+        f"{df_forecast['origin'].nunique()} origens (meia-noite) x {horizon} passos | "
+        "recursos externos (irradiação) usam os valores observados"
+    )
+
+    show_horizon_metrics(df_metrics, "MAE recursivo")
+
+
+def show_direct_horizons(experiment):
+    # Modelos diretos já são avaliados por blocos de H horas: df_pred traz o horizonte de cada linha
+    df_pred = experiment["df_pred"]
+    st.write("#### Erro por horizonte (estratégia direta)")
+    st.caption(
+        f"{df_pred['origin'].nunique()} origens x {df_pred['horizon'].max()} modelos, um por horizonte | "
+        "cada modelo usa apenas as features da linha de origem"
+    )
+    show_horizon_metrics(horizon_metrics(df_pred, experiment["y_train"]), "MAE direto")
+
+
+def show_horizon_metrics(df_metrics, label):
+    graph = [go.Scatter(x=df_metrics.index, y=df_metrics["mae"], mode="lines+markers", name=label)]
+    if "mae_oracle" in df_metrics:
+        graph.append(
+            go.Scatter(
+                x=df_metrics.index,
+                y=df_metrics["mae_oracle"],
+                mode="lines",
+                line=dict(dash="dash"),
+                name="MAE um passo",
+            )
+        )
+    layout = dict(
+        height=400,
+        title={"text": "Erro por horizonte de previsão", "x": 0.5, "xanchor": "center"},
+        xaxis=dict(title="Horizonte (horas)"),
+        yaxis=dict(title="Erro (kWh)"),
+    )
+    st.plotly_chart(go.Figure(data=graph, layout=layout), use_container_width=True)
+    st.dataframe(df_metrics.round(4), use_container_width=True)
@@ -3,120 +3,164 @@ import plotly.graph_objects as go
 import pandas as pd
 import lightgbm as lgb
 import streamlit as st
-from pages.model_ml.components.physical_model import PhysicalModel
-from metric_utils import calculate_forecast_accuracy
-from config.settings import IRRADIATION_FEATURES
+from config import settings
+from job_utils import DONE, FAILED, PENDING, JobManager
+from model_utils import MODEL_PARAMS, DirectModel, QuantileModel
+from registry_utils import experiment_key, has_experiment, load_experiment, train_registered
+from fleet_utils import run_fleet
+from tournament_utils import run_tournament
+from tuning_utils import successive_halving
 
 
-def train_evaluate_model(model_type, datasets, target):
-    df_train = datasets["df_train"]
-    df_test = datasets["df_test"]
-
-    if model_type == "XGBoost":
-        df_pred = train_xgboost(df_train, df_test, target)
-    elif model_type == "LightGBM":
-        df_pred = train_lightgbm(df_train, df_test, target)
-    elif model_type == "Physical":
-        df_pred = train_physical_model(df_train, df_test, target)
-    else:
-        raise ValueError(f"Unsupported model type: {model_type}")
+@st.cache_resource(show_spinner=False)
+def get_job_manager():
+    return JobManager(max_workers=settings.TRAINING_WORKERS, history_size=settings.JOB_HISTORY_SIZE)
 
-    return df_pred
 
+def submit_job(name, fn, *args, meta, context=None, **kwargs):
+    # Séries e features da sessão ficam na própria sessão até o resultado ser recolhido;
+    # o job guarda apenas metadados leves
+    st.session_state.job_context = context or {}
+    st.session_state.job_id = get_job_manager().submit(name, fn, *args, meta=meta, **kwargs)
 
-def train_xgboost(df_train, df_test, target):
-    with st.spinner("Treinando o modelo XGBoost..."):
-
-        x_train = df_train.drop(columns=[target])
-        y_train = df_train[target]
-        x_test = df_test.drop(columns=[target])
-        y_test = df_test[target]
-
-        model = xgb.XGBRegressor()
-        model.fit(
-            x_train,
-            y_train,
-            eval_set=[(x_train, y_train), (x_test, y_test)],
-        )
-
-    st.success("Modelo XGBoost treinado com sucesso!")
-    plot_feature_importance(model)
 
-    y_pred = model.predict(x_test)
-    y_pred = pd.DataFrame(y_pred, index=df_test.index, columns=["y_pred"])
-    y_pred["y_true"] = df_test[target]
-    metrics = calculate_forecast_accuracy(y_pred["y_true"], y_pred["y_pred"], df_train[target])
-
-    st.write("XGBoost treinado com sucesso!")
-    return y_pred, metrics
-
-
-def train_lightgbm(df_train, df_test, target):
-    with st.spinner("Treinando o modelo LightGBM..."):
-
-        x_train = df_train.drop(columns=[target])
-        y_train = df_train[target]
-        x_test = df_test.drop(columns=[target])
-        y_test = df_test[target]
+def start_training(model_type, datasets, target):
+    # Resultado já registrado para o mesmo experimento é reaproveitado sem treinar de novo
+    df_train = datasets["df_train"]
+    df_test = datasets["df_test"]
+    st.session_state.pop("experiment", None)
 
-        model = lgb.LGBMRegressor()
-        model.fit(
-            x_train,
-            y_train,
-            eval_set=[(x_train, y_train), (x_test, y_test)],
+    notes = []
+    if model_type == "Physical" and {"ghi", "gti"} <= set(df_train.columns):
+        notes.append(
+            "As colunas 'ghi' e 'gti' estavam presentes. A coluna 'gti' foi removida para evitar redundância."
         )
 
-    st.success("Modelo LightGBM treinado com sucesso!")
-    plot_feature_importance(model)
-
-    y_pred = model.predict(x_test)
-    y_pred = pd.DataFrame(y_pred, index=df_test.index, columns=["y_pred"])
-    y_pred["y_true"] = df_test[target]
-    metrics = calculate_forecast_accuracy(y_pred["y_true"], y_pred["y_pred"], df_train[target])
-
-    st.write("LightGBM treinado com sucesso!")
-    return y_pred, metrics
-
-
-def train_physical_model(df_train, df_test, target):
-    with st.spinner("Treinando o modelo físico..."):
-        exclude_features = df_train.columns.difference(IRRADIATION_FEATURES)
-
-        columns = df_train.columns
-        model_type = "NL"
-        errors = []
-
-        if "air_temp" not in columns:
-            errors.append("O modelo físico requer recurso: 'air_temp'")
-        if "ghi" not in columns and "gti" not in columns:
-            errors.append("O modelo físico requer recurso:'ghi' ou 'gti'")
-
-        if errors:
-            error_message = "Erro(s) ao treinar o modelo físico:\n" + "\n".join(f"- {error}" for error in errors)
-            st.error(error_message)
-            return None
-
-        if "ghi" in columns and "gti" in columns:
-            df_train = df_train.drop(columns=["gti"])
-            df_test = df_test.drop(columns=["gti"])
-            st.info("As colunas 'ghi' e 'gti' estavam presentes. A coluna 'gti' foi removida para evitar redundância.")
-
-        model = PhysicalModel(model_type)
-        X_train = df_train.drop(columns=exclude_features).values.T
-        y_train = df_train[target].values
-        model.fit(X_train, y_train)
-        st.success("Modelo físico treinado com sucesso!")
+    params = MODEL_PARAMS[model_type]
+    key = experiment_key(model_type, params, df_train, df_test, target)
+    meta = {"model": model_type, "target": target, "notes": notes, "key": key, "state_key": "experiment"}
+    context = {"y_train": df_train[target], "df_features": datasets["df_features"]}
+
+    result = load_experiment(key) if has_experiment(key) else None
+    if result is not None:
+        st.session_state.experiment = {**meta, **context, **result, "elapsed": 0.0, "cached": True}
+        return
+
+    submit_job(
+        f"{model_type} - {target}",
+        train_registered,
+        key,
+        model_type,
+        df_train,
+        df_test,
+        target,
+        params=params,
+        meta=meta,
+        context=context,
+    )
+
+
+def start_tournament(model_types, datasets, target):
+    df_train = datasets["df_train"]
+    df_test = datasets["df_test"]
+    st.session_state.pop("tournament", None)
+
+    meta = {"model": ", ".join(model_types), "target": target, "state_key": "tournament"}
+    submit_job(
+        f"Torneio {meta['model']} - {target}",
+        run_tournament,
+        model_types,
+        df_train,
+        df_test,
+        target,
+        meta=meta,
+    )
+
+
+def start_fleet(model_type, datasets, target, df_prod, targets, n_workers):
+    # Mesmas features e mesma divisão do alvo selecionado, aplicadas a todos os medidores
+    df_features = datasets["df_features"]
+    df_train = datasets["df_train"]
+    df_test = datasets["df_test"]
+    st.session_state.pop("fleet", None)
+
+    features = [col for col in df_features.columns if col != target]
+    external = [col for col in features if col in settings.IRRADIATION_FEATURES]
+    internal = [col for col in features if col not in external]
+    split = (df_train.index[0], df_train.index[-1], df_test.index[0], df_test.index[-1])
+
+    meta = {"model": model_type, "target": f"{len(targets)} medidores", "state_key": "fleet"}
+    submit_job(
+        f"Frota {model_type} - {len(targets)} medidores",
+        run_fleet,
+        df_prod,
+        targets,
+        model_type,
+        internal,
+        split,
+        df_external=df_features[external] if external else None,
+        n_workers=n_workers,
+        meta=meta,
+    )
+
+
+def start_search(model_type, datasets, target, search_options):
+    df_train = datasets["df_train"]
+    df_test = datasets["df_test"]
+    st.session_state.pop("search", None)
+
+    meta = {"model": model_type, "target": target, "notes": [], "state_key": "search"}
+    submit_job(
+        f"Busca {model_type} - {target}",
+        successive_halving,
+        model_type,
+        df_train,
+        df_test,
+        target,
+        meta=meta,
+        context={"y_train": df_train[target]},
+        **search_options,
+    )
+
+
+def poll_training():
+    # Recolhe o resultado do job da sessão; enquanto roda, o fragmento consulta o progresso
+    job_id = st.session_state.get("job_id")
+    if job_id is None:
+        return
+
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is not None and not job.finished:
+        show_training_job(job_id)
+        return
+
+    del st.session_state.job_id
+    context = st.session_state.pop("job_context", {})
+    if job is None:
+        return
+
+    result = manager.collect(job_id)
+    if job.status == DONE:
+        st.session_state[job.meta["state_key"]] = {**job.meta, **context, **result, "elapsed": job.elapsed}
+    elif job.status == FAILED:
+        st.error(f"Erro ao treinar o modelo {job.meta['model']}:\n{job.error}")
+    else:
+        st.warning(f"Treinamento do modelo {job.meta['model']} cancelado.")
 
-        X_eval = df_test.drop(columns=exclude_features).values
-        X_eval_t = X_eval.T
 
-        y_pred = model.predict(X_eval_t)
-        y_pred = pd.DataFrame(y_pred, index=df_test.index, columns=["y_pred"])
-        y_pred["y_true"] = df_test[target]
+@st.fragment(run_every=settings.JOB_POLL_INTERVAL)
+def show_training_job(job_id):
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None or job.finished:
+        st.rerun()
 
-        st.write("Modelo físico treinado com sucesso!")
-        metrics = calculate_forecast_accuracy(y_pred["y_true"], y_pred["y_pred"], df_train[target])
-        return y_pred, metrics
+    cols = st.columns([4, 1])
+    status = "Na fila" if job.status == PENDING else "Treinando"
+    cols[0].progress(job.progress, text=f"{status} {job.name}: {job.progress:.0%} ({job.elapsed:.0f}s)")
+    if cols[1].button("⏹️ Cancelar", key=f"cancel_{job_id}"):
+        manager.cancel(job_id)
 
 
 def plot_feature_importance(model, lower_bound=0.1):
@@ -179,12 +223,25 @@ def plot_feature_importance(model, lower_bound=0.1):
 
 
 def get_feature_importance(model):
-    if isinstance(model, xgb.XGBRegressor):
+    if isinstance(model, (DirectModel, QuantileModel)):
+        # Média da importância relativa dos modelos de cada horizonte ou quantil
+        horizons = pd.concat([get_feature_importance(estimator) for estimator in model.estimators])
+        importance = horizons.groupby("feature", sort=False)["percentage"].mean()
+        feature_names, importance = importance.index.to_numpy(), importance.to_numpy()
+    elif isinstance(model, xgb.XGBRegressor):
         importance = model.feature_importances_
         feature_names = model.feature_names_in_
+    elif isinstance(model, xgb.Booster):
+        # Mesmo critério do XGBRegressor.feature_importances_ (gain); features sem split ficam com 0
+        feature_names = model.feature_names
+        scores = model.get_score(importance_type="gain")
+        importance = [scores.get(name, 0.0) for name in feature_names]
     elif isinstance(model, lgb.LGBMRegressor):
         importance = model.feature_importances_
         feature_names = model.feature_name_
+    elif isinstance(model, lgb.Booster):
+        importance = model.feature_importance()
+        feature_names = model.feature_name()
     else:
         raise ValueError("Modelo não suportado. Use XGBoost ou LightGBM.")
 
@@ -1,12 +1,33 @@
+import os
+
 import streamlit as st
-import plotly.graph_objects as go
-from feature_utils import create_features
+from config import settings
+from fleet_utils import fleet_targets
 from load_data import load_data
+from model_utils import DIRECT_MODELS, MODEL_TYPES, QUANTILE_MODELS
+from tournament_utils import DEFAULT_MODELS
+from tuning_utils import SEARCH_SPACES, halving_rungs
+from pages.model_ml.components.backtest import show_backtest
 from pages.model_ml.components.features import select_features
 from pages.model_ml.components.plants import select_plant
+from pages.model_ml.components.results import (
+    show_direct_horizons,
+    show_fleet_results,
+    show_recursive_forecast,
+    show_results,
+    show_search_results,
+    show_tournament_results,
+)
 from pages.model_ml.components.split_dataset import split_train_test
 
-from pages.model_ml.components.train_model import train_evaluate_model
+from pages.model_ml.components.train_model import (
+    get_job_manager,
+    poll_training,
+    start_fleet,
+    start_search,
+    start_tournament,
+    start_training,
+)
 
 st.set_page_config(
     page_title="Machine Learning",
@@ -15,6 +36,8 @@ st.set_page_config(
 )
 
 if st.sidebar.button("🔄 Novo Experimento (Reset Geral)"):
+    if "job_id" in st.session_state:
+        get_job_manager().cancel(st.session_state.job_id)
     st.session_state.clear()
     st.rerun()
 
@@ -42,15 +65,12 @@ st.write(" ")
 st.divider()
 st.subheader("1. Seleção do inversor ou medidor")
 target = select_plant()
-
-
-df_features_all = create_features(df_prod[[target]], target)
 # ==================================================================================================================
 
 st.write(" ")
 st.divider()
 st.subheader("2. Seleção de recursos")
-df_features = select_features(df_features_all, target, df_rad_tempook, df_rad_solcast)
+df_features = select_features(df_prod[[target]], target, df_rad_tempook, df_rad_solcast)
 
 if df_features is None:
     st.stop()
@@ -67,80 +87,142 @@ st.divider()
 st.sidebar.divider()
 st.subheader("4. Seleção do Modelo de Machine Learning")
 
+mode = st.radio(
+    "Modo de execução",
+    (
+        "Experimento único",
+        "Busca de hiperparâmetros",
+        "Torneio de modelos",
+        "Frota (todos os medidores)",
+        "Backtest (walk-forward)",
+    ),
+    horizontal=True,
+)
+
+if mode == "Torneio de modelos":
+    model_types = st.multiselect("Modelos do torneio", MODEL_TYPES, default=DEFAULT_MODELS)
+    if st.button("🏆  Iniciar Torneio", disabled=not model_types):
+        start_tournament(model_types, datasets, target)
+
+    poll_training()
+    tournament = st.session_state.get("tournament")
+    if tournament is None:
+        if "job_id" not in st.session_state:
+            st.warning("Clique em iniciar torneio.")
+        st.stop()
+
+    st.divider()
+    show_tournament_results(tournament)
+    st.stop()
+
 model = st.radio(
     "Selecione o modelo de Machine Learning",
-    ("XGBoost", "Physical", "LightGBM"),
+    ("XGBoost", "Physical", "LightGBM", "Direct XGBoost", "Direct LightGBM"),
 )
+quantile_types = {base_type: model_type for model_type, base_type in QUANTILE_MODELS.items()}
+if model in quantile_types and st.toggle("Previsão probabilística (P10/P50/P90)", False):
+    model = quantile_types[model]
 
-if st.button(f"🧪  Iniciar Experimento: {model}"):
-    df_pred, metrics = train_evaluate_model(model, datasets, target)
-else:
-    st.warning("Clique em iniciar experimento.")
+if mode == "Backtest (walk-forward)":
+    show_backtest(datasets, target, model)
     st.stop()
-# ==================================================================================================================
 
-st.divider()
-st.write("")
-st.write(f"### Resultados: Previsão de Produção de Energia - {model}")
+if mode == "Frota (todos os medidores)":
+    fleet_meters, missing_meters = fleet_targets(df_prod)
+    st.caption(f"Medidores com dados: {', '.join(fleet_meters)}")
+    if missing_meters:
+        st.caption(f"Sem dados carregados (ignorados): {', '.join(missing_meters)}")
+
+    n_cores = os.cpu_count() or 1
+    n_workers = st.number_input("Modelos em paralelo", min_value=1, max_value=n_cores, value=min(4, n_cores))
+    if st.button(f"🏭  Treinar Frota: {model}"):
+        start_fleet(model, datasets, target, df_prod, fleet_meters, n_workers)
+
+    poll_training()
+    fleet = st.session_state.get("fleet")
+    if fleet is None:
+        if "job_id" not in st.session_state:
+            st.warning("Clique em treinar frota.")
+        st.stop()
+
+    st.divider()
+    show_fleet_results(fleet)
+    st.stop()
 
+with st.expander("Intervalos de confiança das métricas (bootstrap em blocos)"):
+    cols = st.columns(4)
+    n_resamples = cols[0].number_input(
+        "Reamostragens",
+        min_value=100,
+        max_value=settings.BOOTSTRAP_MAX_RESAMPLES,
+        value=settings.BOOTSTRAP_RESAMPLES,
+        step=100,
+    )
+    block_size = cols[1].number_input(
+        "Tamanho do bloco (horas)", min_value=1, max_value=24 * 14, value=settings.BOOTSTRAP_BLOCK_SIZE
+    )
 
-# ==================================================================================================================
+if mode == "Busca de hiperparâmetros":
+    if model not in SEARCH_SPACES:
+        st.warning(f"Busca de hiperparâmetros disponível apenas para: {', '.join(SEARCH_SPACES)}")
+        st.stop()
 
-cols = st.columns(4)
-for col, (key, value) in zip(cols, metrics.items()):
-    col.metric(
-        label=f"{key.upper()}",
-        label_visibility="collapsed",
-        value=round(value, 4),
-        delta=f"{key.upper()}",
-        delta_color="normal"
+    cols = st.columns(4)
+    budget = cols[0].number_input(
+        "Orçamento (minutos)", min_value=0.5, max_value=240.0, value=settings.TUNING_BUDGET_SECONDS / 60, step=0.5
+    )
+    n_configs = cols[1].number_input("Configurações iniciais", min_value=3, max_value=729, value=27)
+    eta = cols[2].number_input("Fator de redução (eta)", min_value=2, max_value=5, value=3)
+    n_cores = os.cpu_count() or 1
+    n_workers = cols[3].number_input("Trials em paralelo", min_value=1, max_value=n_cores, value=min(4, n_cores))
+
+    cols = st.columns(4)
+    min_rounds = cols[0].number_input("Rodadas mínimas", min_value=5, max_value=1000, value=30)
+    max_rounds = cols[1].number_input("Rodadas máximas", min_value=10, max_value=10000, value=810)
+    st.caption(
+        "Rungs (configurações x rodadas): "
+        + ", ".join(f"{n} x {rounds}" for n, rounds in halving_rungs(n_configs, min_rounds, max_rounds, eta))
     )
 
-graph = [
-    go.Scatter(
-        x=df_pred.index,
-        y=df_pred["y_true"],
-        mode='lines',
-        line=dict(color="darkcyan"),
-        name='test set'
-    ),
+    if st.button(f"🔎  Iniciar Busca: {model}"):
+        search_options = {
+            "n_configs": n_configs,
+            "min_rounds": min_rounds,
+            "max_rounds": max_rounds,
+            "eta": eta,
+            "budget": budget * 60,
+            "n_workers": n_workers,
+        }
+        start_search(model, datasets, target, search_options)
+
+    poll_training()
+    search = st.session_state.get("search")
+    if search is None:
+        if "job_id" not in st.session_state:
+            st.warning("Clique em iniciar busca.")
+        st.stop()
+
+    st.divider()
+    show_search_results(search)
+    show_results(search, n_resamples, block_size)
+    st.stop()
 
-    go.Scatter(
-        x=df_pred.index,
-        y=df_pred["y_pred"],
-        mode='lines',
-        line=dict(color="coral"),
-        name='predict'
-    )
-]
-layout = dict(
-    height=600,
-    title={
-        "text": f"Produção de Energia: previsão com modelo {model}", 
-        "y": 0.9,
-        "x": 0.5,
-        "xanchor": "center",
-        "yanchor": "top",
-        "font": {"size": 20}
-    },
-    yaxis=dict(title="Produção de Energia (kWh)"),
-    xaxis=dict(
-        title="",
-        type='date',
-        rangeslider=dict(visible=True),
-        rangeselector=dict(
-            buttons=[
-                dict(count=1, label='1d', step='day', stepmode='backward'),
-                dict(count=3, label='3d', step='day', stepmode='backward'),
-                dict(count=7, label='1s', step='day', stepmode='backward'),
-                dict(step='all'),
-            ],
-            font=dict(size=13),
-            bordercolor="#0072B2",
-            borderwidth=1,
-            activecolor="#0072B2",
-        ),
-    ),
-)
-fig = go.Figure(data=graph, layout=layout)
-st.plotly_chart(fig, use_container_width=True)
+if st.button(f"🧪  Iniciar Experimento: {model}"):
+    start_training(model, datasets, target)
+
+poll_training()
+
+experiment = st.session_state.get("experiment")
+if experiment is None:
+    if "job_id" not in st.session_state:
+        st.warning("Clique em iniciar experimento.")
+    st.stop()
+# ==================================================================================================================
+
+st.divider()
+st.write("")
+show_results(experiment, n_resamples, block_size)
+if experiment["model"] in DIRECT_MODELS:
+    show_direct_horizons(experiment)
+else:
+    show_recursive_forecast(experiment)
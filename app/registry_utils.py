@@ -0,0 +1,227 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from config import settings
+from model_utils import DIRECT_MODELS, QUANTILE_MODELS, DirectModel, PhysicalEstimator, QuantileModel, train_evaluate
+from pages.model_ml.components.physical_model import PhysicalModel
+from utils import dataset_fingerprint
+
+logger = logging.getLogger("solar_app")
+
+MODEL_FILES = {
+    "XGBoost": "model.ubj",
+    "LightGBM": "model.txt",
+    "Physical": "model.json",
+    "Direct XGBoost": "direct",
+    "Direct LightGBM": "direct",
+    "Quantile XGBoost": "quantile",
+    "Quantile LightGBM": "quantile",
+}
+LIBRARY_VERSIONS = {
+    "XGBoost": xgb.__version__,
+    "LightGBM": lgb.__version__,
+    "Physical": "1",
+    "Direct XGBoost": xgb.__version__,
+    "Direct LightGBM": lgb.__version__,
+    "Quantile XGBoost": xgb.__version__,
+    "Quantile LightGBM": lgb.__version__,
+}
+
+_lock = threading.Lock()
+
+
+def experiment_key(model_type, params, df_train, df_test, target):
+    # Endereçamento por conteúdo: qualquer mudança nos dados, recursos, divisão ou parâmetros
+    # gera outra chave
+    spec = {
+        "model_type": model_type,
+        "version": LIBRARY_VERSIONS[model_type],
+        "params": params,
+        "features": [col for col in df_train.columns if col != target],
+        "target": target,
+        "train": [str(df_train.index[0]), str(df_train.index[-1])],
+        "test": [str(df_test.index[0]), str(df_test.index[-1])],
+        "data": [dataset_fingerprint(df_train), dataset_fingerprint(df_test)],
+    }
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def train_registered(
+    key, model_type, df_train, df_test, target, params=None, n_jobs=None, progress=None, cancel_event=None
+):
+    result = train_evaluate(
+        model_type,
+        df_train,
+        df_test,
+        target,
+        params=params,
+        progress=progress,
+        cancel_event=cancel_event,
+        n_jobs=n_jobs,
+    )
+    try:
+        save_experiment(key, model_type, result, meta={"target": target, "params": params})
+    except OSError as e:
+        logger.warning(f"Falha ao registrar o experimento {key[:8]}: {e}")
+    return result
+
+
+def get_entry_path(key):
+    return settings.MODEL_REGISTRY_DIR / key
+
+
+def has_experiment(key):
+    return (get_entry_path(key) / "meta.json").exists()
+
+
+def save_experiment(key, model_type, result, meta=None):
+    path = get_entry_path(key)
+    if has_experiment(key):
+        return path
+
+    # Grava em um diretório temporário e renomeia: leitores nunca veem uma entrada parcial
+    tmp_path = settings.MODEL_REGISTRY_DIR / f".tmp-{uuid.uuid4().hex}"
+    tmp_path.mkdir(parents=True)
+    try:
+        save_estimator(result["estimator"], model_type, tmp_path / MODEL_FILES[model_type])
+        result["df_pred"].to_parquet(tmp_path / "predictions.parquet")
+        (tmp_path / "metrics.json").write_text(json.dumps(result["metrics"]))
+
+        entry = {"key": key, "model_type": model_type, "created": time.time(), "last_used": time.time()}
+        entry.update(meta or {})
+        entry["size"] = sum(file.stat().st_size for file in tmp_path.rglob("*") if file.is_file())
+        (tmp_path / "meta.json").write_text(json.dumps(entry, default=str))
+
+        tmp_path.rename(path)
+    except OSError:
+        # Outro processo gravou a mesma chave primeiro
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not has_experiment(key):
+            raise
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    logger.info(f"Experimento {key[:8]} registrado em {path}")
+    evict(settings.MODEL_REGISTRY_MAX_BYTES)
+    return path
+
+
+def load_experiment(key):
+    path = get_entry_path(key)
+    try:
+        entry = json.loads((path / "meta.json").read_text())
+        model_type = entry["model_type"]
+        result = {
+            "estimator": load_estimator(model_type, path / MODEL_FILES[model_type]),
+            "df_pred": pd.read_parquet(path / "predictions.parquet"),
+            "metrics": json.loads((path / "metrics.json").read_text()),
+        }
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Entrada inválida no registro {key[:8]}: {e}")
+        return None
+
+    touch(path, entry)
+    return result
+
+
+def save_estimator(model, model_type, file_path):
+    # Formatos nativos de cada biblioteca: carregam mais rápido que pickle e sobrevivem a upgrades
+    if model_type == "XGBoost":
+        model.save_model(file_path)
+    elif model_type == "LightGBM":
+        booster = model.booster_ if isinstance(model, lgb.LGBMRegressor) else model
+        booster.save_model(file_path)
+    elif model_type in DIRECT_MODELS:
+        # Um arquivo por horizonte, no formato nativo da biblioteca base
+        file_path.mkdir()
+        for horizon, estimator in enumerate(model.estimators, start=1):
+            save_estimator(estimator, model.model_type, file_path / f"h{horizon}_{MODEL_FILES[model.model_type]}")
+    elif model_type in QUANTILE_MODELS:
+        file_path.mkdir()
+        (file_path / "quantiles.json").write_text(json.dumps(model.quantiles))
+        for idx, estimator in enumerate(model.estimators):
+            save_estimator(estimator, model.model_type, file_path / f"q{idx}_{MODEL_FILES[model.model_type]}")
+    elif model_type == "Physical":
+        params = {
+            "model_type": model.model.model_type,
+            "params": np.asarray(model.model.params).tolist(),
+            "columns": model.columns,
+        }
+        file_path.write_text(json.dumps(params))
+    else:
+        raise ValueError(f"Unsupported model type: {model_type}")
+
+
+def load_estimator(model_type, file_path):
+    if model_type == "XGBoost":
+        return xgb.Booster(model_file=str(file_path))
+    if model_type == "LightGBM":
+        return lgb.Booster(model_file=str(file_path))
+    if model_type in DIRECT_MODELS:
+        base_type = DIRECT_MODELS[model_type]
+        files = file_path.glob(f"h*_{MODEL_FILES[base_type]}")
+        files = sorted(files, key=lambda file: int(file.name[1:].split("_")[0]))
+        if not files:
+            raise ValueError(f"Nenhum modelo de horizonte em {file_path}")
+        return DirectModel(base_type, [load_estimator(base_type, file) for file in files])
+    if model_type in QUANTILE_MODELS:
+        base_type = QUANTILE_MODELS[model_type]
+        quantiles = json.loads((file_path / "quantiles.json").read_text())
+        files = file_path.glob(f"q*_{MODEL_FILES[base_type]}")
+        files = sorted(files, key=lambda file: int(file.name[1:].split("_")[0]))
+        return QuantileModel(base_type, [load_estimator(base_type, file) for file in files], quantiles)
+    if model_type == "Physical":
+        params = json.loads(file_path.read_text())
+        model = PhysicalModel(params["model_type"])
+        model.params = np.asarray(params["params"])
+        return PhysicalEstimator(model, params["columns"])
+    raise ValueError(f"Unsupported model type: {model_type}")
+
+
+def touch(path, entry):
+    # Grava num arquivo temporário e substitui com os.replace: load_experiment e evict
+    # concorrentes leem o meta.json antigo ou o novo, nunca um arquivo truncado
+    entry["last_used"] = time.time()
+    tmp_path = path / f".meta-{uuid.uuid4().hex}.json"
+    try:
+        tmp_path.write_text(json.dumps(entry, default=str))
+        os.replace(tmp_path, path / "meta.json")
+    except OSError:
+        # Entrada removida por evict durante a leitura
+        tmp_path.unlink(missing_ok=True)
+
+
+def list_experiments():
+    entries = []
+    for meta_path in settings.MODEL_REGISTRY_DIR.glob("*/meta.json"):
+        if meta_path.parent.name.startswith("."):
+            continue
+        try:
+            entries.append(json.loads(meta_path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+
+def evict(max_bytes):
+    # Remove as entradas usadas há mais tempo até o registro caber no limite
+    with _lock:
+        entries = sorted(list_experiments(), key=lambda entry: entry["last_used"])
+        total = sum(entry["size"] for entry in entries)
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(get_entry_path(entry["key"]), ignore_errors=True)
+            total -= entry["size"]
+            logger.info(f"Experimento {entry['key'][:8]} removido do registro (LRU)")
@@ -0,0 +1,109 @@
+import logging
+import shutil
+from pathlib import Path
+
+import pandas as pd
+from config import settings
+
+logger = logging.getLogger("solar_app")
+
+PARTITION_FREQ = "M"
+
+
+def get_store_path(file_name):
+    return settings.STORE_DATA_DIR / Path(file_name).stem
+
+
+def store_exists(file_name):
+    return any(get_store_path(file_name).glob("*.parquet"))
+
+
+def is_store_stale(file_name):
+    csv_path = settings.FINAL_DATA_DIR / file_name
+    if not store_exists(file_name):
+        return True
+    if not csv_path.exists():
+        return False
+
+    store_mtime = min(part.stat().st_mtime for part in get_store_path(file_name).glob("*.parquet"))
+    return csv_path.stat().st_mtime > store_mtime
+
+
+def apply_schema(df):
+    float_cols = df.select_dtypes(include="float64").columns
+    if float_cols.empty:
+        return df
+    return df.astype({col: settings.METER_DTYPE for col in float_cols})
+
+
+def read_csv_dataset(filepath, freq):
+    df = pd.read_csv(filepath, parse_dates=[settings.DATE_COL])
+    df.set_index(settings.DATE_COL, inplace=True)
+    df.index = df.index.tz_localize(None)
+    df = df.sort_index()
+    return apply_schema(df.asfreq(freq))
+
+
+def write_partitions(df, path):
+    path.mkdir(parents=True, exist_ok=True)
+
+    for period, df_part in df.groupby(df.index.to_period(PARTITION_FREQ)):
+        df_part.to_parquet(path / f"{period}.parquet")
+
+
+def convert_csv_to_store(file_name, freq=settings.FREQUENCY):
+    csv_path = settings.FINAL_DATA_DIR / file_name
+    path = get_store_path(file_name)
+    logger.info(f"Convertendo {csv_path} para {path}")
+
+    df = read_csv_dataset(csv_path, freq)
+
+    if path.exists():
+        shutil.rmtree(path)
+    write_partitions(df, path)
+    return df
+
+
+def read_store(path, freq, schema=True):
+    df = pd.read_parquet(path)
+    if schema:
+        df = apply_schema(df)
+
+    # As partições são gravadas ordenadas e já regularizadas, então basta validar
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+
+    try:
+        df.index.freq = freq
+    except ValueError:
+        logger.warning(f"Índice irregular em {path}, aplicando asfreq({freq})")
+        df = df.asfreq(freq)
+    return df
+
+
+def load_store(file_name, freq):
+    if is_store_stale(file_name):
+        convert_csv_to_store(file_name, freq)
+
+    logger.info(f"Carregando dados: {get_store_path(file_name)}")
+    return read_store(get_store_path(file_name), freq)
+
+
+def convert_all(freq=settings.FREQUENCY):
+    for csv_path in sorted(settings.FINAL_DATA_DIR.glob("*.csv")):
+        try:
+            convert_csv_to_store(csv_path.name, freq)
+        except Exception as e:
+            logger.error(f"Falha ao converter {csv_path.name}: {e}")
+
+
+if __name__ == "__main__":
+    from feature_utils import update_feature_table
+    from load_data import DATASETS, load_process_data
+
+    logging.basicConfig(level=logging.INFO)
+    convert_all()
+
+    df_prod = load_process_data(DATASETS["df_prod"], settings.FREQUENCY, "df_prod")
+    for target in settings.TARGETS:
+        update_feature_table(df_prod, target)
@@ -0,0 +1,85 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from metric_utils import score_predictions
+from model_utils import MODEL_PARAMS, TrainingCancelled
+from registry_utils import experiment_key, has_experiment, load_experiment, train_registered
+from utils import partition_threads
+
+logger = logging.getLogger("solar_app")
+
+# Modelos treinados por bibliotecas multithread; o modelo físico (curve_fit) usa uma única thread
+THREADED_MODELS = [
+    "XGBoost",
+    "LightGBM",
+    "Direct XGBoost",
+    "Direct LightGBM",
+    "Quantile XGBoost",
+    "Quantile LightGBM",
+]
+# Seleção inicial do torneio; os modelos diretos (24 boosters) e de quantis são opcionais
+DEFAULT_MODELS = ["XGBoost", "LightGBM", "Physical"]
+
+
+def run_tournament(model_types, df_train, df_test, target, progress=None, cancel_event=None):
+    # Todos os modelos no mesmo split, em paralelo; resultados já registrados são reaproveitados
+    # Um núcleo para cada modelo de thread única; o restante dividido entre os boosters
+    n_threaded = sum(model_type in THREADED_MODELS for model_type in model_types)
+    n_jobs = partition_threads(n_threaded, n_single=len(model_types) - n_threaded)
+    threads = {model_type: n_jobs if model_type in THREADED_MODELS else 1 for model_type in model_types}
+    model_progress = dict.fromkeys(model_types, 0.0)
+
+    def update(model_type, value):
+        model_progress[model_type] = value
+        if progress is not None:
+            progress(sum(model_progress.values()) / len(model_progress))
+
+    def run(model_type):
+        start = time.perf_counter()
+        params = MODEL_PARAMS[model_type]
+        key = experiment_key(model_type, params, df_train, df_test, target)
+        result = load_experiment(key) if has_experiment(key) else None
+        cached = result is not None
+        if not cached:
+            result = train_registered(
+                key,
+                model_type,
+                df_train,
+                df_test,
+                target,
+                params=params,
+                n_jobs=threads[model_type],
+                progress=lambda value: update(model_type, value),
+                cancel_event=cancel_event,
+            )
+        update(model_type, 1.0)
+        return {**result, "key": key, "cached": cached, "elapsed": time.perf_counter() - start}
+
+    logger.info(f"Torneio {target}: {threads}")
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=len(model_types), thread_name_prefix="tournament") as executor:
+        futures = {model_type: executor.submit(run, model_type) for model_type in model_types}
+        for model_type, future in futures.items():
+            try:
+                results[model_type] = future.result()
+            except TrainingCancelled:
+                raise
+            except Exception as e:
+                logger.warning(f"Torneio: {model_type} falhou: {e}")
+                errors[model_type] = str(e)
+
+    return {"results": results, "errors": errors, "comparison": compare_models(results, df_train[target])}
+
+
+def compare_models(results, y_train):
+    if not results:
+        return pd.DataFrame()
+
+    # Todas as previsões são avaliadas numa única chamada vetorizada
+    df_preds = pd.DataFrame({model_type: result["df_pred"]["y_pred"] for model_type, result in results.items()})
+    y_true = next(iter(results.values()))["df_pred"]["y_true"]
+    df_comparison = score_predictions(y_true, df_preds, y_train)
+    df_comparison["tempo (s)"] = [results[model_type]["elapsed"] for model_type in df_comparison.index]
+    return df_comparison
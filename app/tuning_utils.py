@@ -0,0 +1,214 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from config import settings
+from model_utils import BinnedDatasets, TrainingCancelled, fit_lightgbm, fit_xgboost, is_cancelled, split_xy
+from registry_utils import experiment_key, train_registered
+from utils import partition_threads
+
+logger = logging.getLogger("solar_app")
+
+# Espaços de busca: (tipo, mínimo, máximo); "log" amostra uniformemente na escala logarítmica
+SEARCH_SPACES = {
+    "XGBoost": {
+        "learning_rate": ("log", 0.01, 0.3),
+        "max_depth": ("int", 3, 10),
+        "min_child_weight": ("log", 1.0, 20.0),
+        "subsample": ("float", 0.5, 1.0),
+        "colsample_bytree": ("float", 0.5, 1.0),
+        "reg_lambda": ("log", 1e-3, 10.0),
+    },
+    "LightGBM": {
+        "learning_rate": ("log", 0.01, 0.3),
+        "num_leaves": ("int", 15, 255),
+        "min_child_samples": ("int", 5, 100),
+        "subsample": ("float", 0.5, 1.0),
+        "colsample_bytree": ("float", 0.5, 1.0),
+        "reg_lambda": ("log", 1e-3, 10.0),
+    },
+}
+FIXED_PARAMS = {
+    "XGBoost": {},
+    "LightGBM": {"subsample_freq": 1},
+}
+# Opções só de log: não mudam o modelo e ficam fora de best_params e da chave do experimento
+FIT_OPTIONS = {
+    "XGBoost": {"verbose": False},
+    "LightGBM": {"verbose": -1},
+}
+FIT_FUNCTIONS = {
+    "XGBoost": fit_xgboost,
+    "LightGBM": fit_lightgbm,
+}
+
+
+class BudgetEvent:
+    # Mesmo contrato de threading.Event.is_set: sinaliza cancelamento do usuário ou fim do orçamento
+    def __init__(self, deadline, cancel_event=None):
+        self.deadline = deadline
+        self.cancel_event = cancel_event
+
+    def is_set(self):
+        return time.monotonic() >= self.deadline or is_cancelled(self.cancel_event)
+
+
+def sample_config(model_type, rng):
+    config = {}
+    for name, (kind, low, high) in SEARCH_SPACES[model_type].items():
+        if kind == "log":
+            config[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        elif kind == "int":
+            config[name] = int(rng.integers(low, high + 1))
+        else:
+            config[name] = float(rng.uniform(low, high))
+    return config
+
+
+def halving_rungs(n_configs, min_rounds, max_rounds, eta):
+    # (configurações, rodadas de boosting) por rung: a cada rung sobra 1/eta com eta vezes mais rodadas.
+    # Aritmética inteira: log em ponto flutuante truncaria o último rung (ex.: log(1000, 10) < 3)
+    rungs = [(n_configs, min(min_rounds, max_rounds))]
+    while rungs[-1][1] * eta <= max_rounds:
+        n_keep, n_rounds = rungs[-1]
+        rungs.append((max(1, n_keep // eta), n_rounds * eta))
+    return rungs
+
+
+def validation_split(df_train, fraction):
+    # A poda usa o último conjunto do eval_set: a cauda do treino, nunca o conjunto de teste
+    n_valid = max(1, int(len(df_train) * fraction))
+    return df_train.iloc[:-n_valid], df_train.iloc[-n_valid:]
+
+
+def eval_score(evals_result):
+    # Último valor da primeira métrica do último conjunto do eval_set (rmse no XGBoost, l2 no LightGBM)
+    history = next(iter(list(evals_result.values())[-1].values()))
+    return float(history[-1])
+
+
+def successive_halving(
+    model_type,
+    df_train,
+    df_test,
+    target,
+    n_configs=27,
+    min_rounds=30,
+    max_rounds=810,
+    eta=3,
+    budget=settings.TUNING_BUDGET_SECONDS,
+    validation_fraction=settings.TUNING_VALIDATION_FRACTION,
+    n_workers=None,
+    seed=None,
+    progress=None,
+    cancel_event=None,
+):
+    start = time.monotonic()
+    stop_event = BudgetEvent(start + budget, cancel_event)
+    rng = np.random.default_rng(seed)
+
+    df_fit, df_valid = validation_split(df_train, validation_fraction)
+    x_fit, y_fit = split_xy(df_fit, target)
+    eval_set = [(x_fit, y_fit), split_xy(df_valid, target)]
+    # Todas as tentativas usam o mesmo recorte: cada worker bina treino e validação uma única vez
+    datasets = BinnedDatasets()
+
+    n_workers = max(1, n_workers or os.cpu_count() or 1)
+    n_jobs = partition_threads(n_workers)
+    rungs = halving_rungs(n_configs, min_rounds, max_rounds, eta)
+    n_trials = sum(n for n, _ in rungs)
+    fit = FIT_FUNCTIONS[model_type]
+
+    configs = {config_id: sample_config(model_type, rng) for config_id in range(n_configs)}
+    trials = []
+
+    def run_trial(config_id, rung, n_rounds):
+        trial_start = time.monotonic()
+        params = {**FIT_OPTIONS[model_type], **FIXED_PARAMS[model_type], **configs[config_id], "n_estimators": n_rounds}
+        evals_result = {}
+        fit(
+            x_fit,
+            y_fit,
+            eval_set=eval_set,
+            n_jobs=n_jobs,
+            cancel_event=stop_event,
+            evals_result=evals_result,
+            datasets=datasets,
+            **params,
+        )
+        return {
+            "config": config_id,
+            "rung": rung,
+            "n_estimators": n_rounds,
+            "score": eval_score(evals_result),
+            "elapsed": time.monotonic() - trial_start,
+        }
+
+    logger.info(f"Busca {model_type}: rungs {rungs}, {n_workers} workers x {n_jobs} threads, orçamento {budget}s")
+    survivors = list(configs)
+    with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="tuning") as executor:
+        for rung, (n_keep, n_rounds) in enumerate(rungs):
+            survivors = survivors[:n_keep]
+            if stop_event.is_set() or not survivors:
+                break
+
+            futures = [executor.submit(run_trial, config_id, rung, n_rounds) for config_id in survivors]
+            rung_trials = []
+            for future in as_completed(futures):
+                try:
+                    rung_trials.append(future.result())
+                except TrainingCancelled:
+                    continue
+                if progress is not None:
+                    done = len(trials) + len(rung_trials)
+                    progress(min(0.95, max(done / n_trials, (time.monotonic() - start) / budget)))
+
+            trials.extend(rung_trials)
+            # Rung incompleto (orçamento esgotado) ainda ordena o que terminou
+            survivors = [trial["config"] for trial in sorted(rung_trials, key=lambda trial: trial["score"])]
+
+    if is_cancelled(cancel_event):
+        raise TrainingCancelled()
+    if not trials:
+        raise ValueError("Nenhuma configuração concluída dentro do orçamento de tempo")
+
+    df_trials = pd.DataFrame(trials)
+    df_trials = df_trials.join(pd.DataFrame.from_dict(configs, orient="index"), on="config")
+    best = df_trials.sort_values(["rung", "score"], ascending=[False, True]).iloc[0]
+    best_params = {
+        **FIXED_PARAMS[model_type],
+        **configs[int(best["config"])],
+        "n_estimators": int(best["n_estimators"]),
+    }
+
+    # Modelo final com a melhor configuração no treino completo, avaliado no teste e registrado.
+    # O orçamento da busca já foi consumido: o treino final tem um orçamento próprio de mesmo tamanho
+    key = experiment_key(model_type, best_params, df_train, df_test, target)
+    try:
+        result = train_registered(
+            key,
+            model_type,
+            df_train,
+            df_test,
+            target,
+            params={**best_params, **FIT_OPTIONS[model_type]},
+            n_jobs=n_workers * n_jobs,
+            cancel_event=BudgetEvent(time.monotonic() + budget, cancel_event),
+        )
+    except TrainingCancelled:
+        if is_cancelled(cancel_event):
+            raise
+        raise ValueError("Orçamento de tempo esgotado no treino final da busca") from None
+    if progress is not None:
+        progress(1.0)
+
+    return {
+        **result,
+        "key": key,
+        "best_params": best_params,
+        "trials": df_trials,
+        "search_elapsed": time.monotonic() - start,
+    }
@@ -1,6 +1,13 @@
+import hashlib
+import os
 import pickle
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
 
 def save_model(model):
     try:
@@ -12,3 +19,65 @@ def save_model(model):
         model_path = Path("modelo/extra_tree_model.joblib")
         with model_path.open(mode="wb") as file:
             pickle.dump(model, file)
+
+
+def dataset_fingerprint(df):
+    digest = hashlib.sha1()
+    digest.update(str(list(df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(_canonical_nan(df), index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _canonical_nan(df):
+    # O hash usa os bytes dos floats: NaN com sinal ou payload diferentes (ex.: -nan de reduções
+    # vetorizadas) dariam chaves diferentes para os mesmos dados
+    positions = [i for i, dtype in enumerate(df.dtypes) if dtype.kind == "f" and df.iloc[:, i].hasnans]
+    if not positions:
+        return df
+
+    df = df.copy(deep=False)
+    for i in positions:
+        values = df.iloc[:, i].to_numpy(copy=True)
+        values[np.isnan(values)] = np.nan
+        df.isetitem(i, values)
+    return df
+
+
+def partition_threads(n_workers, n_cores=None, n_single=0):
+    # Divide os núcleos entre n_workers treinos multithread (XGBoost/LightGBM) para não disputarem
+    # CPU, reservando um núcleo para cada um dos n_single treinos de thread única
+    n_cores = n_cores or os.cpu_count() or 1
+    return max(1, (n_cores - n_single) // max(1, n_workers))
+
+
+class LRUCache:
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtest_utils import make_folds, run_backtest
+
+INDEX = pd.date_range("2024-01-01", periods=24 * 10, freq="h")
+
+
+def test_make_folds_expanding():
+    folds = make_folds(INDEX, "2024-01-05", horizon=24, step=48)
+    assert [fold["origin"] for fold in folds] == [96, 144, 192]
+    assert all(fold["train_start"] == 0 for fold in folds)
+    assert all(fold["test_end"] == fold["origin"] + 24 for fold in folds)
+    assert [fold["fold"] for fold in folds] == [0, 1, 2]
+
+
+def test_make_folds_sliding_and_limits():
+    folds = make_folds(INDEX, "2024-01-02", horizon=24, step=24, window="sliding", train_size=36, n_folds=3)
+    assert [(fold["train_start"], fold["origin"]) for fold in folds] == [(0, 24), (12, 48), (36, 72)]
+
+    # start corta o treino; o último teste não passa do fim do índice
+    folds = make_folds(INDEX, "2024-01-08", horizon=30, step=24, start="2024-01-03")
+    assert [(fold["train_start"], fold["origin"], fold["test_end"]) for fold in folds] == [(48, 168, 198), (48, 192, 222)]
+
+
+def test_make_folds_validation():
+    with pytest.raises(ValueError):
+        make_folds(INDEX, "2024-01-05", horizon=24, step=24, window="rolling")
+    with pytest.raises(ValueError):
+        make_folds(INDEX, "2024-01-05", horizon=24, step=24, window="sliding")
+    # Origem no início do índice: sem treino, o fold é descartado e a série segue pelo passo
+    assert [fold["origin"] for fold in make_folds(INDEX, "2024-01-01", horizon=24, step=24, n_folds=2)] == [24, 48]
+
+
+def test_run_backtest_collects_fold_errors():
+    rng = np.random.default_rng(9)
+    df = pd.DataFrame({"y": rng.random(len(INDEX)), "hour": INDEX.hour}, index=INDEX)
+    folds = make_folds(INDEX, "2024-01-05", horizon=24, step=48)
+
+    df_pred, summary = run_backtest(df, "y", "XGBoost", folds, n_workers=1)
+    assert list(summary["folds"].index) == [0, 1, 2]
+    assert list(summary["folds"]["origin"]) == [INDEX[fold["origin"]] for fold in folds]
+    assert summary["errors"].empty
+    assert len(df_pred) == 24 * len(folds)
+
+    # O modelo físico exige irradiação: todos os folds falham e o erro é informado
+    with pytest.raises(ValueError, match="air_temp"):
+        run_backtest(df, "y", "Physical", folds, n_workers=1)
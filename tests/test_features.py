@@ -0,0 +1,222 @@
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from feature_utils import (
+    LAG_STATISTICS,
+    WINDOW_AGGREGATIONS,
+    add_cyclic_features,
+    create_features,
+    create_multi_target_features,
+    lag_matrix,
+    lag_statistics,
+    read_feature_table,
+    rolling_window_stats,
+    update_feature_table,
+)
+from sklego.preprocessing import RepeatingBasisFunction
+from utils import dataset_fingerprint
+
+LAGS = [1, 24, 48]
+WINDOWS = [3, 24]
+# Features gravadas em float32: tolerância de alguns eps relativos à escala do alvo
+RTOL = 4 * np.finfo(np.float32).eps
+ATOL = 1e-5
+
+
+def baseline_features(df, target, lags, windows):
+    # Referência ingênua: shift, rolling e agregações linha a linha do pandas
+    df = df.copy()
+    df["hour"] = df.index.hour
+    df["day"] = df.index.day
+    df["day_of_week"] = df.index.weekday
+    df["month"] = df.index.month
+    df["is_weekend"] = df.day_of_week.isin([5, 6]).astype(int)
+    df["is_night"] = ((df["hour"] >= 18) | (df["hour"] <= 6)).astype(int)
+
+    time_diff = df.index - df.index.min()
+    df["time_since"] = time_diff.total_seconds() / 3600
+    df["time_since_2"] = df["time_since"] ** 2
+
+    for col in ["hour", "day", "day_of_week"]:
+        freq = df[col].max() if df[col].min() != 0 else df[col].max() + 1
+        df[f"{col}_sin"] = np.sin(df[col] * (2.0 * np.pi / freq))
+        df[f"{col}_cos"] = np.cos(df[col] * (2.0 * np.pi / freq))
+
+    rbf = RepeatingBasisFunction(n_periods=12, column="hour", input_range=(0, 23), remainder="drop")
+    df_rbf = pd.DataFrame(rbf.fit(df).transform(df), index=df.index)
+    df_rbf.columns = [f"rbf_{col}" for col in df_rbf.columns]
+    df = pd.concat([df, df_rbf], axis=1)
+
+    col_lags = [f"lag{lag}" for lag in lags]
+    for lag, name in zip(lags, col_lags):
+        df[name] = df[target].shift(lag)
+    df["lag_mean"] = df[col_lags].mean(axis="columns")
+    df["lag_median"] = df[col_lags].median(axis="columns")
+    df["lag_std"] = df[col_lags].std(axis="columns")
+
+    for window in windows:
+        temp = df[target].rolling(window=window).agg(WINDOW_AGGREGATIONS).shift(1)
+        temp.columns = [f"window{window}_{agg}" for agg in WINDOW_AGGREGATIONS]
+        df = pd.concat([df, temp], axis="columns")
+    return df
+
+
+def assert_features_close(actual, expected):
+    assert sorted(actual.columns) == sorted(expected.columns)
+    for col in expected.columns:
+        np.testing.assert_allclose(
+            actual[col].to_numpy(dtype=np.float64),
+            expected[col].to_numpy(dtype=np.float64),
+            rtol=RTOL,
+            atol=ATOL,
+            err_msg=col,
+        )
+
+
+@pytest.fixture
+def df_meters():
+    index = pd.date_range("2024-01-01", periods=24 * 21, freq="h")
+    rng = np.random.default_rng(0)
+    daylight = np.clip(np.sin((index.hour - 6) / 12 * np.pi), 0, None)
+    values = {
+        "a": daylight * 10 + rng.random(len(index)),
+        "b": daylight * 50 + rng.random(len(index)) * 5,
+    }
+    df = pd.DataFrame(values, index=index).astype("float32")
+    # Trechos constantes e ausentes exercitam o desvio zero e a propagação de NaN
+    df.iloc[100:130, 0] = 0.0
+    df.iloc[200:203, 1] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("target", ["a", "b"])
+def test_create_features_matches_baseline(df_meters, target):
+    actual = create_features(df_meters[[target]], target, LAGS, WINDOWS)
+    expected = baseline_features(df_meters[[target]], target, LAGS, WINDOWS)
+    assert_features_close(actual, expected)
+
+
+def test_cyclic_features_with_fixed_periods(df_meters):
+    df = pd.DataFrame({"day": df_meters.index.day}, index=df_meters.index)
+    df = add_cyclic_features(df, columns=["day"], periods=settings.CYCLIC_PERIODS)
+    angles = df_meters.index.day.to_numpy() * (2.0 * np.pi / settings.CYCLIC_PERIODS["day"])
+    np.testing.assert_allclose(df["day_sin"], np.sin(angles), rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(df["day_cos"], np.cos(angles), rtol=1e-12, atol=1e-12)
+
+
+def test_create_features_subset_matches_full(df_meters):
+    features = ["lag24", "lag_std", "window3_median", "window24_max", "hour_sin", "rbf_5"]
+    full = create_features(df_meters[["a"]], "a", LAGS, WINDOWS)
+    subset = create_features(df_meters[["a"]], "a", LAGS, WINDOWS, features=features)
+    assert list(subset.columns) == ["a"] + features
+    pd.testing.assert_frame_equal(subset, full[["a"] + features])
+
+
+def test_unknown_feature_is_rejected(df_meters):
+    with pytest.raises(ValueError):
+        create_features(df_meters[["a"]], "a", LAGS, WINDOWS, features=["lag24", "lag7"])
+
+
+def test_multi_target_features_match_single_target(df_meters):
+    multi = create_multi_target_features(df_meters, ["a", "b"], LAGS, WINDOWS)
+    for target in ["a", "b"]:
+        single = create_features(df_meters[[target]], target, LAGS, WINDOWS)
+        # Mesmos valores e dtypes: os dois caminhos geram as mesmas chaves de experimento
+        pd.testing.assert_frame_equal(multi.for_target(target), single)
+        # assert_frame_equal iguala todos os NaN; a chave depende dos bytes
+        assert dataset_fingerprint(multi.for_target(target)) == dataset_fingerprint(single)
+        assert_features_close(
+            multi.for_target(target), baseline_features(df_meters[[target]], target, LAGS, WINDOWS)
+        )
+
+
+def test_fingerprint_ignores_nan_sign(df_meters):
+    negative = df_meters.copy()
+    values = negative["b"].to_numpy(copy=True)
+    values.view(np.uint32)[np.isnan(values)] = 0xFFC00000
+    negative["b"] = values
+    assert np.signbit(negative["b"].iloc[200])
+    assert dataset_fingerprint(negative) == dataset_fingerprint(df_meters)
+    # O frame original não é alterado pelo cálculo da chave
+    assert np.signbit(negative["b"].iloc[200])
+
+
+def test_lag_matrix_and_statistics(df_meters):
+    values = df_meters["b"].to_numpy()
+    block = lag_matrix(values, LAGS)
+    expected = pd.DataFrame({lag: df_meters["b"].shift(lag) for lag in LAGS})
+    np.testing.assert_array_equal(block, expected.to_numpy(dtype=np.float32))
+
+    stats = lag_statistics(block.astype(np.float64))
+    expected = expected.astype(np.float64)
+    references = {
+        "lag_mean": expected.mean(axis="columns"),
+        "lag_median": expected.median(axis="columns"),
+        "lag_std": expected.std(axis="columns"),
+    }
+    for name in LAG_STATISTICS:
+        np.testing.assert_allclose(stats[name], references[name].to_numpy(), rtol=1e-12, atol=1e-12, err_msg=name)
+
+
+def test_lag_columns_reject_invalid_lags(df_meters):
+    with pytest.raises(ValueError):
+        create_features(df_meters[["a"]], "a", [0, 24], WINDOWS)
+
+
+def test_rolling_window_stats_matches_pandas(df_meters):
+    pairs = [(window, agg) for window in [1, 3, 24] for agg in WINDOW_AGGREGATIONS]
+    stats = rolling_window_stats(df_meters["b"].to_numpy(), pairs)
+    for idx, (window, agg) in enumerate(pairs):
+        expected = df_meters["b"].astype(np.float64).rolling(window).agg(agg).shift(1)
+        np.testing.assert_allclose(stats[:, idx], expected.to_numpy(), rtol=1e-9, atol=1e-9, err_msg=f"{window} {agg}")
+
+
+def test_rolling_window_stats_multiple_targets(df_meters):
+    # Um bloco (linhas, alvos) equivale a cada alvo calculado separadamente
+    pairs = [(3, "mean"), (24, "std"), (24, "median")]
+    block = rolling_window_stats(df_meters.to_numpy(), pairs)
+    assert block.shape == (len(df_meters), 2, len(pairs))
+    for idx, col in enumerate(df_meters.columns):
+        np.testing.assert_array_equal(block[:, idx], rolling_window_stats(df_meters[col].to_numpy(), pairs))
+
+
+@pytest.fixture
+def df_months():
+    # Três meses de partições: o append deve regravar apenas a partir do mês do corte
+    index = pd.date_range("2024-01-10", "2024-03-20", freq="h")
+    rng = np.random.default_rng(8)
+    df = pd.DataFrame({"a": rng.random(len(index)) * 10}, index=index).astype("float32")
+    df.index.freq = "h"
+    return df
+
+
+def test_feature_table_append_matches_rebuild(df_months, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FEATURE_STORE_DIR", tmp_path / "incremental")
+    update_feature_table(df_months.loc[:"2024-02-20 05:00"], "a", LAGS, WINDOWS)
+    january = tmp_path / "incremental" / "a" / "2024-01.parquet"
+    written_at = january.stat().st_mtime_ns
+
+    appended = update_feature_table(df_months, "a", LAGS, WINDOWS)
+    stored, meta = read_feature_table("a")
+    assert january.stat().st_mtime_ns == written_at
+    assert meta["origin"] == str(df_months.index[0])
+
+    monkeypatch.setattr(settings, "FEATURE_STORE_DIR", tmp_path / "full")
+    rebuilt = update_feature_table(df_months, "a", LAGS, WINDOWS)
+    pd.testing.assert_frame_equal(appended, rebuilt, check_freq=False)
+    pd.testing.assert_frame_equal(stored, rebuilt, check_freq=False)
+
+
+def test_feature_table_rebuilds_when_history_changes(df_months, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FEATURE_STORE_DIR", tmp_path / "incremental")
+    update_feature_table(df_months.loc[:"2024-02-20 05:00"], "a", LAGS, WINDOWS)
+
+    # Correção de um valor já gravado: a tabela é recriada em vez de receber só o append
+    df_fixed = df_months.copy()
+    df_fixed.iloc[30, 0] = -1.0
+    table = update_feature_table(df_fixed, "a", LAGS, WINDOWS)
+    assert table["lag1"].iloc[31] == -1.0
+
+    monkeypatch.setattr(settings, "FEATURE_STORE_DIR", tmp_path / "full")
+    pd.testing.assert_frame_equal(table, update_feature_table(df_fixed, "a", LAGS, WINDOWS), check_freq=False)
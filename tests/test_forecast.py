@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from feature_utils import create_features
+from forecast_utils import RecursiveState, forecast_origins, recursive_forecast
+
+AGGREGATIONS = {"mean", "std", "min", "median", "max"}
+
+
+def naive_window(series, window, agg):
+    # Estatística da janela pelo pandas sobre a série completa (histórico + valores empurrados)
+    return getattr(pd.Series(series[-window:]).rolling(window), agg)().iloc[-1]
+
+
+@pytest.mark.parametrize("windows", [[3, 24], [1, 6]])
+def test_recursive_state_matches_naive_windows(windows):
+    rng = np.random.default_rng(7)
+    n_origins, size = 4, 30
+    history = rng.random((n_origins, size)) * 10
+    history[1, -10:] = 2.5  # janela constante: desvio exatamente zero
+    history[2, -2] = np.nan  # NaN no histórico: a janela só fica válida quando ele sai
+
+    state = RecursiveState(history, windows)
+    series = [list(row) for row in history]
+    for step in range(40):
+        values = rng.random(n_origins) * 10
+        values[1] = 2.5
+        if step == 10:
+            values[3] = np.nan
+        state.push(values)
+        for origin, value in enumerate(values):
+            series[origin].append(value)
+
+        for lag in [1, 2, size]:
+            np.testing.assert_array_equal(state.lag(lag), [row[-lag] for row in series])
+
+        for window in windows:
+            stats = state.window_features(window, AGGREGATIONS)
+            for agg in AGGREGATIONS:
+                expected = [naive_window(row, window, agg) for row in series]
+                np.testing.assert_allclose(stats[agg], expected, rtol=1e-9, atol=1e-9, err_msg=f"{window} {agg}")
+
+    assert state.window_features(max(windows), {"std"})["std"][1] == 0.0
+
+
+def test_recursive_state_requires_history_for_largest_window():
+    with pytest.raises(ValueError):
+        RecursiveState(np.zeros((2, 5)), [6])
+
+
+class LinearModel:
+    # Modelo determinístico sobre as colunas que dependem do alvo e do calendário
+    weights = {"lag1": 0.5, "lag24": 0.2, "lag_mean": 0.1, "window3_mean": 0.15, "window24_std": 0.3, "hour": 0.01}
+
+    def predict(self, x):
+        return sum(weight * x[col].to_numpy() for col, weight in self.weights.items())
+
+
+def test_recursive_forecast_matches_feature_recomputation():
+    index = pd.date_range("2024-01-01", periods=24 * 8, freq="h")
+    rng = np.random.default_rng(12)
+    df = pd.DataFrame({"y": rng.random(len(index)) * 10}, index=index)
+    lags, windows, horizon = [1, 24, 48], [3, 24], 6
+    df_features = create_features(df, "y", lags, windows)
+    origins = forecast_origins(index, index[24 * 3], index[-1], horizon)
+
+    df_forecast = recursive_forecast(LinearModel(), df_features, "y", origins, horizon, lags=lags)
+    assert list(df_forecast["horizon"]) == list(range(1, horizon + 1)) * len(origins)
+
+    # Referência ingênua: cada previsão é gravada na série e as features são recalculadas do zero
+    model = LinearModel()
+    for origin in origins:
+        series = df.copy()
+        position = index.get_loc(origin)
+        for step in range(horizon):
+            row = create_features(series, "y", lags, windows).iloc[[position + step]]
+            series.iloc[position + step, 0] = model.predict(row)[0]
+
+        expected = series["y"].iloc[position:position + horizon].to_numpy()
+        actual = df_forecast.loc[df_forecast["origin"] == origin, "y_pred"].to_numpy()
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
@@ -0,0 +1,102 @@
+import threading
+
+from job_utils import CANCELLED, DONE, FAILED, JobManager
+from model_utils import TrainingCancelled
+
+TIMEOUT = 10
+
+
+def train(value, progress=None, cancel_event=None):
+    progress(0.5)
+    return value
+
+
+def wait_cancel(started, progress=None, cancel_event=None):
+    started.set()
+    if cancel_event.wait(TIMEOUT):
+        raise TrainingCancelled()
+    return "not cancelled"
+
+
+def fail(progress=None, cancel_event=None):
+    raise ValueError("dados inválidos")
+
+
+def test_job_runs_and_reports_result():
+    manager = JobManager(max_workers=1)
+    job_id = manager.submit("treino", train, 42, meta={"target": "a"})
+    job = manager.get(job_id)
+    job.future.result(TIMEOUT)
+
+    assert job.status == DONE and job.finished
+    assert job.result == 42 and job.progress == 0.5 and job.meta == {"target": "a"}
+
+    failed = manager.get(manager.submit("falha", fail))
+    failed.future.result(TIMEOUT)
+    assert failed.status == FAILED and failed.error == "dados inválidos"
+    manager.shutdown()
+
+
+def test_cancel_running_and_pending_jobs():
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+    running = manager.get(manager.submit("longo", wait_cancel, started))
+    pending = manager.get(manager.submit("na fila", train, 1))
+    assert started.wait(TIMEOUT)
+
+    # O job na fila é cancelado antes de rodar; o job em execução para no próximo ponto de verificação
+    assert manager.cancel(pending.id)
+    assert pending.status == CANCELLED and pending.result is None
+    assert manager.cancel(running.id)
+    running.future.result(TIMEOUT)
+    assert running.status == CANCELLED
+
+    assert not manager.cancel(running.id)
+    assert not manager.cancel("desconhecido")
+    manager.shutdown()
+
+
+def test_prune_keeps_running_jobs_and_newest_history():
+    manager = JobManager(max_workers=2, history_size=2)
+    started = threading.Event()
+    running = manager.submit("longo", wait_cancel, started)
+    assert started.wait(TIMEOUT)
+
+    finished = []
+    for value in range(2):
+        job_id = manager.submit(f"treino {value}", train, value)
+        manager.get(job_id).future.result(TIMEOUT)
+        finished.append(job_id)
+    assert {job.id for job in manager.jobs()} == {running, finished[1]}
+
+    # A cada envio, os finalizados mais antigos saem até o histórico caber no limite
+    last = manager.submit("último", train, 2)
+    assert {job.id for job in manager.jobs()} == {running, last}
+    manager.cancel(running)
+    manager.shutdown()
+
+
+def test_collect_hands_over_result_once():
+    manager = JobManager(max_workers=1)
+    job_id = manager.submit("treino", train, {"estimator": object()}, meta={"model": "XGBoost"})
+    job = manager.get(job_id)
+    job.future.result(TIMEOUT)
+
+    result = manager.collect(job_id)
+    assert set(result) == {"estimator"}
+    # O histórico mantém estado e metadados, sem o resultado
+    assert manager.get(job_id).status == DONE and manager.get(job_id).meta == {"model": "XGBoost"}
+    assert manager.get(job_id).result is None
+    assert manager.collect(job_id) is None
+    assert manager.collect("desconhecido") is None
+    manager.shutdown()
+
+
+def test_collect_ignores_running_job():
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+    job_id = manager.submit("longo", wait_cancel, started)
+    assert started.wait(TIMEOUT)
+    assert manager.collect(job_id) is None
+    manager.cancel(job_id)
+    manager.shutdown()
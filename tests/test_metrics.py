@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+import pytest
+from metric_utils import (
+    ForecastMetricsAccumulator,
+    HourlyHistogram,
+    block_bootstrap_indices,
+    bootstrap_metrics,
+    calculate_forecast_accuracy,
+    error_breakdown,
+    grouped_metrics,
+    histogram_range,
+    mean_absolute_percentage_error,
+    mean_absolute_scaled_error,
+    pinball_loss,
+    quantile_metrics,
+    score_predictions,
+)
+from config import settings
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+
+@pytest.fixture
+def forecast():
+    index = pd.date_range("2024-03-01", periods=24 * 30, freq="h")
+    rng = np.random.default_rng(1)
+    daylight = np.clip(np.sin((index.hour - 6) / 12 * np.pi), 0, None)
+    y_true = pd.Series(daylight * 40 + rng.random(len(index)), index=index)
+    y_pred = y_true + rng.normal(0, 2, len(index))
+    y_train = pd.Series(daylight * 38 + rng.random(len(index)), index=index - pd.Timedelta(days=30))
+    return y_true, y_pred, y_train
+
+
+def test_forecast_accuracy_matches_reference(forecast):
+    y_true, y_pred, y_train = forecast
+    metrics = calculate_forecast_accuracy(y_true, y_pred, y_train)
+
+    assert metrics["mae"] == pytest.approx(mean_absolute_error(y_true, y_pred))
+    assert metrics["mse"] == pytest.approx(mean_squared_error(y_true, y_pred))
+    assert metrics["rmse"] == pytest.approx(np.sqrt(mean_squared_error(y_true, y_pred)))
+    assert metrics["r2"] == pytest.approx(r2_score(y_true, y_pred))
+    assert metrics["mape"] == pytest.approx(mean_absolute_percentage_error(y_true, y_pred))
+    assert metrics["mase"] == pytest.approx(mean_absolute_scaled_error(y_true, y_pred, y_train))
+
+    day = y_true.between_time("06:00:00", "18:00:00").index
+    assert metrics["mae_day"] == pytest.approx(mean_absolute_error(y_true[day], y_pred[day]))
+    assert metrics["r2_day"] == pytest.approx(r2_score(y_true[day], y_pred[day]))
+
+
+def test_score_predictions_matches_each_model(forecast):
+    y_true, y_pred, y_train = forecast
+    df_preds = pd.DataFrame({"ruim": y_pred + 5, "bom": y_pred, "perfeito": y_true})
+    df_scores = score_predictions(y_true, df_preds, y_train)
+
+    for model in df_preds.columns:
+        expected = calculate_forecast_accuracy(y_true, df_preds[model], y_train)
+        assert df_scores.loc[model].to_dict() == pytest.approx(expected)
+    assert df_scores.loc["perfeito", "r2"] == 1.0
+
+
+def test_grouped_metrics_matches_groupby(forecast):
+    y_true, y_pred, y_train = forecast
+    codes = np.asarray(y_true.index.hour)
+    naive = y_train.groupby(y_train.index.hour).median().to_numpy()[codes]
+    df_group = grouped_metrics(y_true.to_numpy(), y_pred.to_numpy(), naive, codes)
+
+    for hour, rows in y_true.groupby(codes).groups.items():
+        true, pred = y_true.loc[rows], y_pred.loc[rows]
+        expected_mase = mean_absolute_error(true, pred) / mean_absolute_error(true, naive[codes == hour])
+        assert df_group.loc[hour, "mae"] == pytest.approx(mean_absolute_error(true, pred))
+        assert df_group.loc[hour, "rmse"] == pytest.approx(np.sqrt(mean_squared_error(true, pred)))
+        assert df_group.loc[hour, "r2"] == pytest.approx(r2_score(true, pred))
+        assert df_group.loc[hour, "mase"] == pytest.approx(expected_mase)
+        assert df_group.loc[hour, "n_obs"] == len(rows)
+
+
+def test_error_breakdown_weekday_labels_and_inverters(forecast):
+    y_true, y_pred, y_train = forecast
+    df_pred = pd.DataFrame({"y_true": y_true, "y_pred": y_pred})
+    breakdown = error_breakdown(df_pred, y_train)
+
+    # 2024-03-01 é sexta-feira: rótulos pelo weekday do pandas (segunda = 0)
+    fridays = y_true.index.weekday == 4
+    assert breakdown["weekday"].index[0] == settings.DAY_MAPPING[0]
+    friday = breakdown["weekday"].loc[settings.DAY_MAPPING[4]]
+    assert friday["mae"] == pytest.approx(mean_absolute_error(y_true[fridays], y_pred[fridays]))
+    assert friday["n_obs"] == fridays.sum()
+    assert "inverter" not in breakdown
+
+    # Formato longo: cada inversor é avaliado com as medianas horárias do seu próprio treino
+    df_long = pd.concat([df_pred.assign(inverter="inv1"), df_pred.assign(inverter="inv2")])
+    y_train_wide = pd.DataFrame({"inv1": y_train, "inv2": y_train * 2})
+    by_inverter = error_breakdown(df_long, y_train_wide)["inverter"]
+    assert list(by_inverter.index) == ["inv1", "inv2"]
+    for inverter, column in [("inv1", y_train), ("inv2", y_train * 2)]:
+        expected = calculate_forecast_accuracy(y_true, y_pred, column)
+        assert by_inverter.loc[inverter, "mae"] == pytest.approx(expected["mae"])
+        assert by_inverter.loc[inverter, "mase"] == pytest.approx(expected["mase"])
+
+
+def test_hourly_histogram_medians_within_half_bin():
+    rng = np.random.default_rng(6)
+    hours = np.repeat(np.arange(24), 101)
+    values = rng.uniform(0, 100, len(hours))
+    histogram = HourlyHistogram((0.0, 120.0), 481)
+    histogram.update(hours, values)
+
+    step = histogram.centers[1] - histogram.centers[0]
+    expected = pd.Series(values).groupby(hours).median().to_numpy()
+    assert np.abs(histogram.medians() - expected).max() <= step / 2 + 1e-12
+    assert histogram.clipped == 0
+
+
+def test_hourly_histogram_merge_and_clipping():
+    left, right = HourlyHistogram((0.0, 10.0), 11), HourlyHistogram((0.0, 10.0), 11)
+    left.update([0, 0, 1], [-5.0, 3.0, 50.0])
+    right.update([0, 1], [3.0, 4.0])
+    left.merge(right)
+
+    assert left.underflow[0] == 1 and left.overflow[1] == 1 and left.clipped == 2
+    assert left.counts.sum() == 5
+    np.testing.assert_array_equal(left.medians()[:2], [3.0, 4.0])
+    assert np.isnan(left.medians()[2:]).all()
+
+    with pytest.raises(ValueError):
+        left.merge(HourlyHistogram((0.0, 20.0), 11))
+
+
+def test_accumulator_chunks_match_batch_metrics(forecast):
+    y_true, y_pred, y_train = forecast
+    value_range = histogram_range(pd.concat([y_true, y_train]))
+
+    # Dois workers com lotes parciais, combinados ao final
+    left, right = ForecastMetricsAccumulator(value_range, 2001), ForecastMetricsAccumulator(value_range, 2001)
+    left.update_reference(y_train)
+    right.update_reference(y_train.iloc[:0])
+    for start in range(0, len(y_true), 100):
+        worker = left if start % 200 else right
+        worker.update(y_true.iloc[start:start + 100], y_pred.iloc[start:start + 100])
+    metrics = left.merge(right).result()
+
+    expected = calculate_forecast_accuracy(y_true, y_pred, y_train)
+    for key in ["mae", "rmse", "mse", "r2", "mape", "mae_day", "r2_day"]:
+        assert metrics[key] == pytest.approx(expected[key], rel=1e-9), key
+    # MASE pelas medianas do histograma: aproximado pela resolução dos bins
+    assert metrics["mase"] == pytest.approx(expected["mase"], rel=1e-2)
+    assert left.clipped() == 0
+
+
+@pytest.mark.parametrize("n_obs, block_size", [(100, 24), (50, 7), (10, 24), (30, 1)])
+def test_block_bootstrap_indices(n_obs, block_size):
+    idx = block_bootstrap_indices(n_obs, 40, block_size, np.random.default_rng(4))
+    assert idx.shape == (n_obs, 40)
+    assert idx.min() >= 0 and idx.max() < n_obs
+
+    # Cada reamostragem é uma concatenação de blocos de posições consecutivas
+    block_size = min(block_size, n_obs)
+    for column in idx.T:
+        for start in range(0, n_obs, block_size):
+            block = column[start:start + block_size]
+            np.testing.assert_array_equal(np.diff(block), 1)
+
+    again = block_bootstrap_indices(n_obs, 40, block_size, np.random.default_rng(4))
+    np.testing.assert_array_equal(idx, again)
+
+
+def test_bootstrap_metrics_chunks_match_single_pass(forecast, monkeypatch):
+    y_true, y_pred, y_train = forecast
+    # Lotes de 7 reamostragens (o último incompleto) contra uma única passada
+    monkeypatch.setattr(settings, "BOOTSTRAP_CHUNK_CELLS", len(y_true) * 7)
+    chunked = bootstrap_metrics(y_true, y_pred, y_train, n_resamples=300, seed=5)
+    monkeypatch.setattr(settings, "BOOTSTRAP_CHUNK_CELLS", len(y_true) * 1000)
+    single = bootstrap_metrics(y_true, y_pred, y_train, n_resamples=300, seed=5)
+
+    pd.testing.assert_frame_equal(chunked, single)
+    assert (chunked["lower"] <= chunked["value"]).all() and (chunked["value"] <= chunked["upper"]).all()
+
+
+@pytest.mark.parametrize("quantile", [0.1, 0.5, 0.9])
+def test_pinball_loss_matches_loop(quantile):
+    rng = np.random.default_rng(2)
+    y_true = rng.normal(size=200)
+    y_quantile = rng.normal(size=200)
+
+    losses = []
+    for true, pred in zip(y_true, y_quantile):
+        residual = true - pred
+        losses.append(quantile * residual if residual >= 0 else (quantile - 1) * residual)
+    assert pinball_loss(y_true, y_quantile, quantile) == pytest.approx(np.mean(losses))
+
+
+def test_pinball_loss_median_is_half_mae():
+    rng = np.random.default_rng(3)
+    y_true, y_pred = rng.normal(size=100), rng.normal(size=100)
+    assert pinball_loss(y_true, y_pred, 0.5) == pytest.approx(mean_absolute_error(y_true, y_pred) / 2)
+
+
+def test_quantile_metrics_coverage():
+    y_true = np.array([0.0, 1.0, 2.0, 3.0, 10.0])
+    df_pred = pd.DataFrame(
+        {
+            "y_true": y_true,
+            "y_p10": [0.0, 0.5, 2.5, 2.0, 4.0],
+            "y_p50": [0.0, 1.0, 3.0, 3.0, 5.0],
+            "y_p90": [0.0, 1.5, 3.5, 4.0, 6.0],
+        }
+    )
+    metrics = quantile_metrics(df_pred, [0.9, 0.1, 0.5])
+    # Faixa degenerada em zero conta como coberta; 2.0 fica abaixo e 10.0 acima do intervalo
+    assert metrics["coverage_80"] == pytest.approx(3 / 5)
+    assert metrics["pinball_p50"] == pytest.approx(mean_absolute_error(y_true, df_pred["y_p50"]) / 2)
+    assert metrics["pinball_p90"] == pytest.approx(pinball_loss(y_true, df_pred["y_p90"], 0.9))
@@ -0,0 +1,134 @@
+import lightgbm as lgb
+import model_utils
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+from model_utils import (
+    DirectModel,
+    binned_reference,
+    fit_direct,
+    fit_quantile,
+    horizon_views,
+    predict_direct,
+    predict_features,
+)
+from utils import LRUCache
+
+
+class ShiftEstimator:
+    # Prevê o valor da coluna "t" da origem somado ao deslocamento do horizonte
+    def __init__(self, offset):
+        self.offset = offset
+
+    def predict(self, x):
+        return x["t"].to_numpy() + self.offset
+
+
+@pytest.fixture
+def df_hours():
+    index = pd.date_range("2024-01-01", periods=50, freq="h")
+    return pd.DataFrame({"t": np.arange(50.0), "y": np.arange(50.0) * 10}, index=index)
+
+
+def test_horizon_views_align_origin_and_target(df_hours):
+    x, y = df_hours[["t"]], df_hours["y"]
+    views = list(horizon_views(x, y, 4))
+    assert len(views) == 4
+
+    for offset, (x_h, y_h) in enumerate(views):
+        assert len(x_h) == len(y_h) == len(x) - offset
+        assert x_h.index.equals(y_h.index)
+        # Linha da origem t recebe o alvo de t + offset
+        np.testing.assert_array_equal(y_h.to_numpy(), (x_h["t"].to_numpy() + offset) * 10)
+        assert np.shares_memory(y_h.to_numpy(), y.to_numpy())
+
+
+@pytest.mark.parametrize("horizon", [1, 4, 7])
+def test_predict_direct_aligns_blocks(df_hours, horizon):
+    model = DirectModel("XGBoost", [ShiftEstimator(offset) for offset in range(horizon)])
+    df_pred = predict_direct(model, df_hours, "y")
+
+    # Todas as linhas do teste, sem sobreposição; a última origem pode ter horizonte incompleto
+    assert df_pred.index.equals(df_hours.index)
+    np.testing.assert_array_equal(df_pred["y_pred"], df_hours["t"])
+    np.testing.assert_array_equal(df_pred["y_true"], df_hours["y"])
+
+    positions = np.arange(len(df_hours))
+    np.testing.assert_array_equal(df_pred["horizon"], positions % horizon + 1)
+    assert df_pred["origin"].equals(
+        pd.Series(df_hours.index[positions - positions % horizon], index=df_hours.index, name="origin")
+    )
+
+
+@pytest.mark.parametrize("model_type", ["XGBoost", "LightGBM"])
+def test_fit_direct_learns_each_horizon(model_type):
+    rng = np.random.default_rng(13)
+    phase = np.arange(400) % 5
+    x = pd.DataFrame({"phase": phase.astype(float), "noise": rng.random(400)})
+    y = pd.Series(phase * 1.0, name="y")
+
+    # O alvo h - 1 horas à frente é (fase + h - 1) % 5: cada booster aprende um deslocamento diferente
+    params = {"n_estimators": 60, "learning_rate": 0.3}
+    if model_type == "LightGBM":
+        params.update(min_child_samples=5, verbose=-1)
+    model = fit_direct(model_type, x, y, horizon=3, n_jobs=2, **params)
+    assert model.horizon == 3
+
+    block = model.predict(x)
+    for offset in range(3):
+        np.testing.assert_allclose(block[:, offset], (phase + offset) % 5, atol=0.1)
+
+
+@pytest.mark.parametrize("model_type", ["XGBoost", "LightGBM"])
+def test_quantile_model_orders_quantiles(model_type):
+    rng = np.random.default_rng(14)
+    x = pd.DataFrame({"x": rng.random(500)})
+    y = pd.Series(x["x"].to_numpy() * 10 + rng.normal(0, 1, 500), name="y")
+
+    params = {"n_estimators": 30} if model_type == "XGBoost" else {"n_estimators": 30, "verbose": -1}
+    model = fit_quantile(model_type, x, y, quantiles=[0.9, 0.1, 0.5], n_jobs=2, **params)
+    assert model.quantiles == [0.1, 0.5, 0.9]
+
+    block = model.predict(x)
+    assert block.shape == (len(x), 3)
+    assert (np.diff(block, axis=1) >= 0).all()
+    # Cobertura empírica no treino próxima do nominal de 80%
+    covered = (y.to_numpy() >= block[:, 0]) & (y.to_numpy() <= block[:, 2])
+    assert 0.6 <= covered.mean() <= 0.95
+
+
+@pytest.mark.parametrize("model_type", ["XGBoost", "LightGBM"])
+def test_binned_reference_shared_by_fits_on_same_features(model_type, monkeypatch):
+    monkeypatch.setattr(model_utils, "BINNED_REFERENCES", LRUCache(maxsize=4))
+    rng = np.random.default_rng(15)
+    x = pd.DataFrame({"a": rng.random(300), "b": rng.random(300)})
+    y = pd.Series(x["a"] * 3 + x["b"], name="y")
+    fit = model_utils.fit_xgboost if model_type == "XGBoost" else model_utils.fit_lightgbm
+
+    reference = binned_reference(model_type, x)
+    assert binned_reference(model_type, x.copy()) is reference
+    assert binned_reference(model_type, x.iloc[:-1]) is not reference
+    assert binned_reference(model_type, x[["b", "a"]]) is not reference
+
+    # Os treinos sobre as mesmas features usam a referência em cache e dão o mesmo modelo
+    # que um Dataset construído do zero
+    cached = fit(x, y, n_estimators=20, verbose=-1 if model_type == "LightGBM" else None)
+    if model_type == "XGBoost":
+        fresh = xgb.train({"objective": "reg:squarederror"}, xgb.QuantileDMatrix(x, y), num_boost_round=20)
+    else:
+        fresh = lgb.train({"objective": "regression", "verbose": -1}, lgb.Dataset(x, y), num_boost_round=20)
+    np.testing.assert_allclose(predict_features(cached, x), predict_features(fresh, x), rtol=1e-6)
+    assert len(model_utils.BINNED_REFERENCES) == 3
+
+
+def test_tournament_models_share_one_reference(monkeypatch):
+    monkeypatch.setattr(model_utils, "BINNED_REFERENCES", LRUCache(maxsize=4))
+    rng = np.random.default_rng(16)
+    x = pd.DataFrame({"a": rng.random(200)})
+    y = pd.Series(x["a"] * 2, name="y")
+
+    fit_direct("XGBoost", x, y, horizon=2, n_estimators=5)
+    fit_quantile("XGBoost", x, y, n_estimators=5)
+    model_utils.fit_xgboost(x, y, n_estimators=5)
+    assert len(model_utils.BINNED_REFERENCES) == 1
@@ -0,0 +1,116 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from model_utils import predict_model, train_evaluate
+from registry_utils import (
+    evict,
+    experiment_key,
+    has_experiment,
+    list_experiments,
+    load_experiment,
+    save_experiment,
+    touch,
+)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_DIR", tmp_path)
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_MAX_BYTES", 1024**3)
+    return tmp_path
+
+
+@pytest.fixture
+def split():
+    index = pd.date_range("2024-01-01", periods=24 * 8, freq="h")
+    rng = np.random.default_rng(10)
+    df = pd.DataFrame({"x": rng.random(len(index)), "hour": index.hour}, index=index)
+    df["y"] = 3 * df["x"] + np.sin(df["hour"] / 24 * np.pi) + rng.normal(0, 0.1, len(index))
+    return df.iloc[:24 * 6], df.iloc[24 * 6:]
+
+
+@pytest.mark.parametrize("model_type", ["XGBoost", "LightGBM", "Direct XGBoost", "Quantile LightGBM"])
+def test_registry_round_trip(registry, split, model_type):
+    df_train, df_test = split
+    params = {"n_estimators": 5}
+    if model_type == "Direct XGBoost":
+        params["horizon"] = 4
+    result = train_evaluate(model_type, df_train, df_test, "y", params=params)
+
+    key = experiment_key(model_type, params, df_train, df_test, "y")
+    assert not has_experiment(key)
+    save_experiment(key, model_type, result, meta={"target": "y", "params": params})
+    assert has_experiment(key)
+    assert not any(path.name.startswith(".tmp-") for path in registry.iterdir())
+
+    loaded = load_experiment(key)
+    pd.testing.assert_frame_equal(loaded["df_pred"], result["df_pred"], check_freq=False)
+    assert loaded["metrics"] == pytest.approx(result["metrics"])
+    # O estimador recarregado do formato nativo reproduz as previsões
+    np.testing.assert_allclose(
+        predict_model(loaded["estimator"], df_test, "y")["y_pred"], result["df_pred"]["y_pred"], rtol=1e-6
+    )
+
+
+def test_experiment_key_changes_with_data_and_params(split):
+    df_train, df_test = split
+    key = experiment_key("XGBoost", {}, df_train, df_test, "y")
+    assert key == experiment_key("XGBoost", {}, df_train.copy(), df_test.copy(), "y")
+    assert key != experiment_key("XGBoost", {"max_depth": 3}, df_train, df_test, "y")
+
+    changed = df_train.copy()
+    changed.iloc[0, 0] += 1
+    assert key != experiment_key("XGBoost", {}, changed, df_test, "y")
+
+
+def test_evict_removes_least_recently_used(registry, split):
+    df_train, df_test = split
+    result = train_evaluate("XGBoost", df_train, df_test, "y", params={"n_estimators": 2})
+    keys = [
+        experiment_key("XGBoost", {"n_estimators": 2, "run": run}, df_train, df_test, "y") for run in range(3)
+    ]
+    for key in keys:
+        save_experiment(key, "XGBoost", result)
+
+    # A primeira entrada volta a ser usada; a segunda passa a ser a menos recente
+    assert load_experiment(keys[0]) is not None
+    last_used = json.loads((registry / keys[0] / "meta.json").read_text())["last_used"]
+    assert last_used > json.loads((registry / keys[2] / "meta.json").read_text())["last_used"]
+
+    size = max(entry["size"] for entry in list_experiments())
+    evict(2 * size)
+    assert [has_experiment(key) for key in keys] == [True, False, True]
+
+    evict(0)
+    assert list_experiments() == []
+
+
+def test_touch_never_exposes_partial_meta(registry, split):
+    df_train, df_test = split
+    key = experiment_key("XGBoost", {}, df_train, df_test, "y")
+    path = save_experiment(key, "XGBoost", train_evaluate("XGBoost", df_train, df_test, "y", params={"n_estimators": 2}))
+    entry = json.loads((path / "meta.json").read_text())
+    entry["notes"] = "x" * 100_000
+
+    stop = threading.Event()
+
+    def touch_loop():
+        while not stop.is_set():
+            touch(path, dict(entry))
+
+    thread = threading.Thread(target=touch_loop)
+    thread.start()
+    try:
+        # Leitores concorrentes sempre encontram um JSON completo
+        for _ in range(300):
+            assert json.loads((path / "meta.json").read_text())["key"] == key
+    finally:
+        stop.set()
+        thread.join()
+
+    assert [file.name for file in path.glob(".meta-*")] == []
+    assert [entry["key"] for entry in list_experiments()] == [key]
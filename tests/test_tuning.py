@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from registry_utils import experiment_key, has_experiment
+from tuning_utils import halving_rungs, successive_halving
+
+
+@pytest.mark.parametrize(
+    "n_configs, min_rounds, max_rounds, eta, expected",
+    [
+        (27, 30, 810, 3, [(27, 30), (9, 90), (3, 270), (1, 810)]),
+        (27, 30, 800, 3, [(27, 30), (9, 90), (3, 270)]),
+        # log(1000, 10) < 3 em ponto flutuante: o último rung não pode ser perdido
+        (100, 1, 1000, 10, [(100, 1), (10, 10), (1, 100), (1, 1000)]),
+        (5, 50, 40, 3, [(5, 40)]),
+    ],
+)
+def test_halving_rungs(n_configs, min_rounds, max_rounds, eta, expected):
+    assert halving_rungs(n_configs, min_rounds, max_rounds, eta) == expected
+
+
+def test_halving_rungs_matches_naive_schedule():
+    for n_configs in [1, 8, 27, 81]:
+        for min_rounds in [1, 10, 30]:
+            for max_rounds in [min_rounds, 100, 810, 1000]:
+                for eta in [2, 3, 4, 10]:
+                    expected = []
+                    rung = 0
+                    while min_rounds * eta**rung <= max_rounds:
+                        expected.append((max(1, n_configs // eta**rung), min_rounds * eta**rung))
+                        rung += 1
+                    assert halving_rungs(n_configs, min_rounds, max_rounds, eta) == expected
+
+
+@pytest.mark.parametrize("model_type", ["XGBoost", "LightGBM"])
+def test_successive_halving_promotes_best_configs(model_type, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_REGISTRY_DIR", tmp_path)
+    index = pd.date_range("2024-01-01", periods=24 * 10, freq="h")
+    rng = np.random.default_rng(11)
+    df = pd.DataFrame({"x": rng.random(len(index)), "hour": index.hour}, index=index)
+    df["y"] = 2 * df["x"] + rng.normal(0, 0.1, len(index))
+
+    result = successive_halving(
+        model_type, df.iloc[:-48], df.iloc[-48:], "y", n_configs=9, min_rounds=2, max_rounds=18, n_workers=2, seed=0
+    )
+    trials = result["trials"]
+    assert trials.groupby("rung")["config"].nunique().to_dict() == {0: 9, 1: 3, 2: 1}
+
+    # Cada rung promove as melhores configurações do rung anterior
+    rung0 = trials[trials["rung"] == 0].sort_values("score")
+    assert set(trials.loc[trials["rung"] == 1, "config"]) == set(rung0["config"].iloc[:3])
+
+    # Opções de log não entram em best_params nem na chave do experimento
+    assert "verbose" not in result["best_params"]
+    assert result["best_params"]["n_estimators"] == 18
+    assert result["key"] == experiment_key(model_type, result["best_params"], df.iloc[:-48], df.iloc[-48:], "y")
+    assert has_experiment(result["key"])
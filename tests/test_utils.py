@@ -0,0 +1,18 @@
+import pytest
+from utils import partition_threads
+
+
+@pytest.mark.parametrize(
+    "n_workers, n_cores, n_single, expected",
+    [
+        (4, 16, 0, 4),
+        (3, 16, 0, 5),
+        (16, 8, 0, 1),
+        (0, 8, 0, 8),
+        # Torneio com 2 boosters e 1 modelo físico em 9 núcleos: 1 núcleo reservado, 4 para cada booster
+        (2, 9, 1, 4),
+        (1, 2, 4, 1),
+    ],
+)
+def test_partition_threads(n_workers, n_cores, n_single, expected):
+    assert partition_threads(n_workers, n_cores, n_single) == expected